@@ -0,0 +1,78 @@
+"""Benchmark: one ClientSession per request vs the shared pooled session.
+
+Fires the same schedule requests at a local stub of the schedule API, first
+the way lib/api.py used to (a new aiohttp.ClientSession, hence a new TCP
+connection, per request), then through the shared session of lib.api, and
+prints the number of connections the stub accepted and p50/p99 latency.
+
+    python benchmarks/api_session.py [requests] [concurrency]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import api  # noqa: E402
+from tests.stub_server import stub_api  # noqa: E402
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+async def timed(call, latencies):
+    started = time.perf_counter()
+    await call()
+    latencies.append(time.perf_counter() - started)
+
+
+async def run(label, call, requests, concurrency, stub):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    connections_before = stub.connections
+
+    async def one(i):
+        async with slots:
+            await timed(lambda: call(i), latencies)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    total = time.perf_counter() - started
+    print(
+        f"{label:<22} connections={stub.connections - connections_before:<5} "
+        f"p50={percentile(latencies, 0.50) * 1000:6.2f}ms p99={percentile(latencies, 0.99) * 1000:6.2f}ms "
+        f"mean={statistics.mean(latencies) * 1000:6.2f}ms total={total:.2f}s"
+    )
+
+
+async def main(requests, concurrency):
+    async with stub_api(delay=0.002) as stub:
+        os.environ['API_URL'] = stub.url
+
+        async def session_per_request(i):
+            # What every fetch used to do
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{stub.url}/08-01-2024?user=user{i}") as response:
+                    await response.json()
+
+        async def shared_session(i):
+            await api._get_json(f"{stub.url}/08-01-2024?user=user{i}")
+
+        await run("session per request", session_per_request, requests, concurrency, stub)
+        await api.start_session()
+        await run("shared pooled session", shared_session, requests, concurrency, stub)
+        await api.close_session()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    requests = args[0] if args else 2000
+    concurrency = args[1] if len(args) > 1 else 20
+    asyncio.run(main(requests, concurrency))
@@ -0,0 +1,92 @@
+"""Benchmark: event-loop lag with blocking vs off-loop user database queries.
+
+Simulates a burst of concurrent commands, each looking a user up and listing
+subscribers, against a throwaway SQLite database. The queries are first run
+the way the handlers used to (lib.user_manager called straight from the
+coroutine), then through lib.user_store's DB thread pool. Meanwhile a ticker
+measures how late the event loop wakes it up: that lag is what every other
+command, heartbeat and cron job waits on.
+
+    python benchmarks/loop_lag.py [commands] [users]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['SQLITE_DATABASE'] = os.path.join(_tmp.name, 'bench.db')
+
+from lib import user_manager, user_store  # noqa: E402
+from lib.db import db, initialize_db, User  # noqa: E402
+
+TICK = 0.005
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+async def blocking_command(user_id):
+    # Before: peewee called on the event loop thread
+    with db.connection_context():
+        user_manager.get_user(user_id)
+        user_manager.get_users_with_preference('daily')
+
+
+async def async_command(user_id):
+    await user_store.get_user(user_id)
+    await user_store.get_users_with_preference('daily')
+
+
+async def run(label, command, commands):
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(command(i) for i in range(commands)))
+    total = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    print(
+        f"{label:<26} loop lag p50={percentile(lags, 0.50) * 1000:7.2f}ms "
+        f"p99={percentile(lags, 0.99) * 1000:7.2f}ms max={max(lags) * 1000:7.2f}ms total={total:.2f}s"
+    )
+
+
+def seed(users):
+    initialize_db()
+    with db.connection_context(), db.atomic():
+        User.insert_many(
+            [{'id': i, 'username': f"user{i}", 'daily': i % 2 == 0} for i in range(users)]
+        ).execute()
+
+
+async def main(commands, users):
+    seed(users)
+    await run("blocking (user_manager)", blocking_command, commands)
+    # The registry would answer get_user from memory: measure the DB path
+    await run("off-loop (user_store)", async_command, commands)
+    user_store.shutdown()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    commands = args[0] if args else 200
+    users = args[1] if len(args) > 1 else 2000
+    asyncio.run(main(commands, users))
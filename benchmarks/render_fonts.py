@@ -0,0 +1,53 @@
+"""Micro-benchmark: resolving font faces on every render vs once per process.
+
+Renders the same day schedule many times, first clearing the font registry
+before each render (what the renderers used to do: look the font files up
+and try to load them on every call), then with the registry loaded once.
+Prints the mean time per render of both and the difference. Needs pycairo.
+
+    python benchmarks/render_fonts.py [renders]
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import fonts  # noqa: E402
+from lib.schedule_utils import day_schedule_image  # noqa: E402
+
+SCHEDULE = [
+    {'name': f"Cours {i}", 'date': '08/01/2024', 'start_time': f"{9 + i}:00", 'end_time': f"{10 + i}:00",
+     'room': f"Salle {i}", 'teacher': "M. Prof"}
+    for i in range(0, 8, 2)
+]
+
+
+def bench(renders, reset_fonts):
+    started = time.perf_counter()
+    for _ in range(renders):
+        if reset_fonts:
+            fonts._faces.clear()
+        success, result = day_schedule_image(SCHEDULE)
+        assert success, result
+    return (time.perf_counter() - started) / renders
+
+
+def main(renders):
+    # The fallback warning would be logged on every render of the first run
+    logging.disable(logging.WARNING)
+    fonts.load_fonts()
+    day_schedule_image(SCHEDULE)
+
+    per_render = bench(renders, reset_fonts=True)
+    registry = bench(renders, reset_fonts=False)
+    print(f"faces loaded per render   {per_render * 1000:7.3f}ms/render")
+    print(f"faces from the registry   {registry * 1000:7.3f}ms/render")
+    print(f"saved                     {(per_render - registry) * 1000:7.3f}ms/render")
+    print(f"font files loaded by pycairo: {not isinstance(fonts.regular_face(), fonts.cairo.ToyFontFace)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,56 @@
+"""Benchmark: drawing the static chrome on every image vs the cached layer.
+
+Renders day and week images with the static layer (background, title, hour
+labels, grid, header bars) redrawn for every image, as before the layer was
+cached, then with this thread's cached layer, and prints the time per image.
+Needs pycairo.
+
+    python benchmarks/static_layer.py [renders]
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import schedule_utils  # noqa: E402
+from lib.schedule_utils import day_schedule_image, week_schedule_image  # noqa: E402
+
+DAY = [
+    {'name': f"Cours {i}", 'date': '08/01/2024', 'start_time': f"{9 + i}:00", 'end_time': f"{10 + i}:00",
+     'room': f"Salle {i}", 'teacher': "M. Prof"}
+    for i in range(0, 8, 2)
+]
+WEEK = [dict(course, date=f"{8 + day:02d}/01/2024") for day in range(5) for course in DAY]
+
+
+def bench(render, schedule, renders, cached):
+    cached_layer = schedule_utils._static_layer
+    if not cached:
+        schedule_utils._static_layer = schedule_utils._draw_static_layer
+    try:
+        started = time.perf_counter()
+        for _ in range(renders):
+            success, result = render(schedule)
+            assert success, result
+        return (time.perf_counter() - started) / renders
+    finally:
+        schedule_utils._static_layer = cached_layer
+
+
+def main(renders):
+    logging.disable(logging.WARNING)
+    for label, render, schedule in (("day 800x900", day_schedule_image, DAY), ("week 1600x900", week_schedule_image, WEEK)):
+        render(schedule)
+        redrawn = bench(render, schedule, renders, cached=False)
+        cached = bench(render, schedule, renders, cached=True)
+        print(
+            f"{label:<14} redrawn {redrawn * 1000:7.3f}ms/image  cached layer {cached * 1000:7.3f}ms/image  "
+            f"({(1 - cached / redrawn) * 100:.0f}% less)"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -2,9 +2,10 @@ import discord
 from discord import app_commands
 import logging
 import io
-from lib.api import fetch_day_schedule
-from lib.schedule_utils import create_schedule_embed, day_schedule_image
-from lib.user_manager import get_user
+from lib.api import serve_day_schedule, CircuitOpenError
+from lib.schedule_utils import create_schedule_embed, STALE_MARKER
+from lib.renderer import render_day_image
+from lib.user_store import get_user
 from datetime import datetime
 
 @discord.app_commands.command(
@@ -31,7 +32,7 @@ async def day(
 
     # If no username provided, check if user is registered
     if username is None:
-        username = get_user(interaction.user.id)
+        username = await get_user(interaction.user.id)
         if not username:
             logging.warning(f"Utilisateur {interaction.user.name} (ID: {interaction.user.id}) non enregistré")
             await interaction.followup.send("Merci d'enregistrer votre nom d'utilisateur avec la commande `/settings register` ou de spécifier un nom d'utilisateur directement.", ephemeral=True)
@@ -48,32 +49,32 @@ async def day(
             return
     
     try:
-        schedule_data = await fetch_day_schedule(username, date)
-        logging.info(f"Nombre de cours trouvés: {len(schedule_data)}")
+        schedule_data, is_stale = await serve_day_schedule(username, date)
+        logging.info(f"Nombre de cours trouvés: {len(schedule_data)}" + (" (données en cache)" if is_stale else ""))
+        # Marker shown when the upstream did not answer in time
+        content = STALE_MARKER if is_stale else None
         
         if not schedule_data:
             await interaction.followup.send("Aucun cours trouvé pour la date spécifiée.", ephemeral=True)
             return
             
         if image:
-            success, result = day_schedule_image(schedule_data)
+            success, result = await render_day_image(schedule_data)
             if not success:
                 logging.error(f"Erreur lors de la génération de l'image: {result}")
                 await interaction.followup.send("Une erreur est survenue lors de la génération de l'image de l'emploi du temps.", ephemeral=True)
                 return
             
-            image_bytes = io.BytesIO(result)
-            image_bytes.seek(0)
-            file = discord.File(fp=image_bytes, filename="day_schedule.png")
-            files = [file]
-            
-            await interaction.followup.send(files=files, ephemeral=True)
+            await interaction.followup.send(content=content, files=[discord.File(fp=io.BytesIO(result), filename="day_schedule.png")], ephemeral=True)
             logging.info(f"Image(s) envoyée(s) à {interaction.user.name}")
         else:
             # Send embed
             embed = create_schedule_embed(schedule_data)
-            await interaction.followup.send(embed=embed, ephemeral=True)
+            await interaction.followup.send(content=content, embed=embed, ephemeral=True)
             logging.info(f"Embed envoyé à {interaction.user.name}")
+    except CircuitOpenError as e:
+        logging.warning(f"API d'emploi du temps indisponible : {e}")
+        await interaction.followup.send("Le service d'emploi du temps est momentanément indisponible. Veuillez réessayer dans quelques minutes.", ephemeral=True)
     except Exception as e:
         error_message = "Une erreur est survenue lors de la récupération de l'emploi du temps. Veuillez réessayer plus tard."
         logging.error(f"Erreur lors de la récupération de l'emploi du temps: {str(e)}")
@@ -4,7 +4,10 @@ import logging
 from dotenv import load_dotenv
 import os
 from lib.user_manager import load_users
-from lib.cron_jobs import run_daily_job, run_weekly_job
+from lib.cron_jobs import prepare_job, revalidate_job, deliver_job
+from lib.api import start_session, close_session, load_persisted_schedules
+from lib.renderer import start_renderer, warm_up, shutdown_renderer
+from lib import user_store, dispatch, persistent_store
 from commands import day, week, settings
 import aiocron
 
@@ -24,7 +27,67 @@ load_dotenv()
 # Bot configuration
 intents = discord.Intents.default()
 intents.dm_messages = True
-bot = commands.Bot(command_prefix=None, intents=intents)
+
+# Notification jobs run in three phases: fetch and render everything ahead of
+# time, re-check the upstream shortly before delivery, then only send at the
+# delivery time. Each phase is a cron expression overridable from the
+# environment; an empty revalidation expression disables that phase.
+CRON_PHASES = {
+    "daily": {
+        "prefetch": os.getenv('DAILY_PREFETCH_CRON', '30 5 * * *'),
+        "revalidate": os.getenv('DAILY_REVALIDATE_CRON', '55 5 * * *'),
+        "deliver": os.getenv('DAILY_DELIVERY_CRON', '0 6 * * *'),  # Every day at 6 AM
+    },
+    "weekly": {
+        "prefetch": os.getenv('WEEKLY_PREFETCH_CRON', '30 5 * * 1'),
+        "revalidate": os.getenv('WEEKLY_REVALIDATE_CRON', '55 5 * * 1'),
+        "deliver": os.getenv('WEEKLY_DELIVERY_CRON', '0 6 * * 1'),  # Every Monday at 6 AM
+    },
+}
+
+
+def schedule_cron_jobs(bot):
+    for name, phases in CRON_PHASES.items():
+        aiocron.crontab(phases["prefetch"], func=prepare_job, args=(name,))
+        if phases["revalidate"]:
+            aiocron.crontab(phases["revalidate"], func=revalidate_job, args=(name,))
+        aiocron.crontab(phases["deliver"], func=deliver_job, args=(bot, name))
+        logging.info(f"Travail {name} planifié : {phases}")
+
+
+class EPSIBot(commands.Bot):
+    """Bot subclass owning the long-lived resources shared by commands and cron jobs."""
+
+    async def setup_hook(self):
+        # Open the pooled HTTP session before any command or cron job runs
+        await start_session()
+        # Come back from a restart with the schedules and images fetched before it
+        if await persistent_store.open_store():
+            await load_persisted_schedules()
+        if not await user_store.check_health():
+            logging.error("La base de données ne répond pas au démarrage")
+        # Serve user lookups from memory, reloaded periodically
+        await user_store.load_cache()
+        user_store.start_refresh()
+        # Start the rendering workers so the first image does not pay their startup
+        start_renderer()
+        await warm_up()
+        # Paced queue for the messages sent by cron jobs
+        dispatch.get_queue().start()
+        # Registered here rather than in on_ready, which runs again on every reconnect
+        schedule_cron_jobs(self)
+
+    async def close(self):
+        user_store.stop_refresh()
+        await dispatch.stop()
+        await close_session()
+        shutdown_renderer()
+        await persistent_store.close_store()
+        await super().close()
+        user_store.shutdown()
+
+
+bot = EPSIBot(command_prefix=None, intents=intents)
 
 @bot.event
 async def on_ready():
@@ -35,22 +98,15 @@ async def on_ready():
     except Exception as e:
         logging.error(f"Échec de la synchronisation des commandes : {e}")
 
-    @aiocron.crontab('0 6 * * *')  # Every day at 6 AM
-    async def daily_cronjob():
-        await run_daily_job(bot)
-
-    # Weekly job: send weekly schedules (every Monday at 06:00)
-    @aiocron.crontab('0 6 * * 1')
-    async def weekly_cronjob():
-        await run_weekly_job(bot)
 
-# Load users when bot starts
-load_users()
+if __name__ == "__main__":
+    # Load users when bot starts
+    load_users()
 
-# Add commands to the bot
-bot.tree.add_command(day.day)
-bot.tree.add_command(week.week)
-bot.tree.add_command(settings.settings)
+    # Add commands to the bot
+    bot.tree.add_command(day.day)
+    bot.tree.add_command(week.week)
+    bot.tree.add_command(settings.settings)
 
-# Get the token from environment variables
-bot.run(os.getenv('DISCORD_TOKEN'))
+    # Get the token from environment variables
+    bot.run(os.getenv('DISCORD_TOKEN'))
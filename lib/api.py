@@ -1,111 +1,666 @@
 import aiohttp
 import os
 import asyncio
+import hashlib
+import json
 from aiohttp import ClientTimeout
 import logging
-from datetime import datetime
+import random
+import time
+from datetime import datetime, timedelta
+from lib.cache import TTLCache, SingleFlight
+from lib.circuit import CircuitBreaker
+from lib import persistent_store
+from lib.env import env_int, env_float
 
-async def fetch_schedule(user, start_time=None, end_time=None, max_retries=3):
-    """Legacy function, kept for backward compatibility"""
-    return await fetch_week_schedule(user, start_time, max_retries)
+# Shared HTTP session, created by start_session() in the bot's setup hook and
+# closed by close_session() on shutdown. Reusing it keeps TCP/TLS connections
+# to the schedule API alive between /day, /week and the cron fan-out.
+_session = None
 
-async def fetch_day_schedule(user, date=None, max_retries=3):
-    """Fetch schedule for a specific day"""
-    logging.info(f"Fetching day schedule for user {user}, date: {date}")
-    base_url = os.getenv('API_URL', 'https://epsi.enzomtp.party')
-    
+# Cache of parsed API responses keyed by (user, DD-MM-YYYY date, scope),
+# built lazily by schedule_cache() once the environment is loaded.
+_schedule_cache = None
+_schedule_ttls = {}
+
+# Last good response per key, kept well past the cache TTL and served when
+# the upstream is slow or down; built lazily by last_good_cache()
+_last_good = None
+
+# Validators of the last good response per key (ETag, Last-Modified and a
+# hash of the raw body), sent back as conditional requests
+_validators = None
+_not_modified = 0
+# Returned by _request_json when the upstream confirmed the stored response
+_NOT_MODIFIED = object()
+
+# Upstream requests currently in flight, shared by identical concurrent callers
+_inflight = SingleFlight()
+
+# Circuit breaker shared by every call to the schedule API, built by circuit()
+_circuit = None
+
+
+class APIError(Exception):
+    """A schedule API request failed (status is None for network errors)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(APIError):
+    """The schedule API is considered down: the request was not attempted."""
+
+
+async def start_session():
+    """Create the shared aiohttp session used for every schedule API call.
+
+    The connector pool is configured from the environment:
+      - API_POOL_LIMIT: total simultaneous connections (default 100)
+      - API_POOL_LIMIT_PER_HOST: simultaneous connections per host (default 20)
+      - API_KEEPALIVE_TIMEOUT: seconds an idle connection is kept open (default 60)
+      - API_DNS_CACHE_TTL: seconds DNS lookups are cached (default 300)
+      - API_TIMEOUT: total timeout per request in seconds (default 30)
+
+    Returns:
+        The shared aiohttp.ClientSession
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        return _session
+
+    connector = aiohttp.TCPConnector(
+        limit=env_int('API_POOL_LIMIT', 100),
+        limit_per_host=env_int('API_POOL_LIMIT_PER_HOST', 20),
+        keepalive_timeout=env_float('API_KEEPALIVE_TIMEOUT', 60),
+        ttl_dns_cache=env_int('API_DNS_CACHE_TTL', 300),
+        use_dns_cache=True,
+    )
+    timeout = ClientTimeout(total=env_float('API_TIMEOUT', 30))
+    _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    logging.info("API session started")
+    return _session
+
+
+async def close_session():
+    """Close the shared aiohttp session and its connection pool."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("API session closed")
+    _session = None
+
+
+async def get_session():
+    """Return the shared session, starting it lazily if the bot hook did not run."""
+    if _session is None or _session.closed:
+        return await start_session()
+    return _session
+
+
+def schedule_cache():
+    """Return the shared schedule response cache.
+
+    Sized and tuned from the environment:
+      - SCHEDULE_CACHE_MAX_ENTRIES: entries kept before LRU eviction (default 2048)
+      - SCHEDULE_CACHE_TTL: fallback TTL in seconds for all periods (default 600)
+      - SCHEDULE_CACHE_PAST_TTL: TTL for periods entirely in the past (default 86400)
+      - SCHEDULE_CACHE_TODAY_TTL: TTL for today / the current week (default 300)
+      - SCHEDULE_CACHE_FUTURE_TTL: TTL for future days and weeks (default 600)
+    """
+    global _schedule_cache
+    if _schedule_cache is None:
+        default_ttl = env_float('SCHEDULE_CACHE_TTL', 600)
+        _schedule_ttls.update(
+            past=env_float('SCHEDULE_CACHE_PAST_TTL', 86400),
+            today=env_float('SCHEDULE_CACHE_TODAY_TTL', min(default_ttl, 300)),
+            future=env_float('SCHEDULE_CACHE_FUTURE_TTL', default_ttl),
+        )
+        _schedule_cache = TTLCache(
+            max_entries=env_int('SCHEDULE_CACHE_MAX_ENTRIES', 2048),
+            default_ttl=default_ttl,
+        )
+    return _schedule_cache
+
+
+def last_good_cache():
+    """Return the store of last good responses used for stale serving.
+
+    Tuned from the environment:
+      - SCHEDULE_STALE_MAX_ENTRIES: entries kept before LRU eviction (default 4096)
+      - SCHEDULE_STALE_MAX_AGE: seconds a response may be served stale (default 604800)
+    """
+    global _last_good
+    if _last_good is None:
+        _last_good = TTLCache(
+            max_entries=env_int('SCHEDULE_STALE_MAX_ENTRIES', 4096),
+            default_ttl=env_float('SCHEDULE_STALE_MAX_AGE', 7 * 24 * 3600),
+        )
+    return _last_good
+
+
+def validator_cache():
+    """Return the per-key validator store, sized and aged like last_good_cache()."""
+    global _validators
+    if _validators is None:
+        _validators = TTLCache(
+            max_entries=env_int('SCHEDULE_STALE_MAX_ENTRIES', 4096),
+            default_ttl=env_float('SCHEDULE_STALE_MAX_AGE', 7 * 24 * 3600),
+        )
+    return _validators
+
+
+def schedule_cache_stats():
+    """Return hit/miss/eviction counters of the schedule cache and coalesced calls."""
+    stats = schedule_cache().stats()
+    stats['coalesced'] = _inflight.stats()
+    return stats
+
+
+def _schedule_ttl(formatted_date, scope):
+    """Pick the cache TTL for a request depending on whether it targets the past."""
+    schedule_cache()
+    first_day = datetime.strptime(formatted_date, "%d-%m-%Y").date()
+    last_day = first_day
+    if scope == "week":
+        first_day -= timedelta(days=first_day.weekday())
+        last_day = first_day + timedelta(days=6)
+
+    today = datetime.now().date()
+    if last_day < today:
+        return _schedule_ttls['past']
+    if first_day <= today:
+        return _schedule_ttls['today']
+    return _schedule_ttls['future']
+
+
+def _format_date(date):
+    """Convert an optional DD/MM/YYYY date into the DD-MM-YYYY format used by the API."""
     # If no date provided, use current date
     if date is None:
         date_obj = datetime.now()
     else:
         # Parse the date string into a datetime object
         date_obj = datetime.strptime(date, "%d/%m/%Y")
-    
-    # Format the date as DD-MM-YYYY for the API request
-    formatted_date = date_obj.strftime("%d-%m-%Y")
-    
-    url = f"{base_url}/{formatted_date}?user={user}"
-    logging.info(f"Requesting URL: {url}")
-    
-    timeout = ClientTimeout(total=30)  # 30 seconds timeout
-    
+
+    return date_obj.strftime("%d-%m-%Y")
+
+
+def circuit():
+    """Return the schedule API circuit breaker.
+
+    Tuned from the environment:
+      - API_BREAKER_THRESHOLD: consecutive failures opening the circuit (default 5)
+      - API_BREAKER_RESET: seconds before a probe request once open (default 30)
+    """
+    global _circuit
+    if _circuit is None:
+        _circuit = CircuitBreaker(
+            "schedule API",
+            failure_threshold=max(1, env_int('API_BREAKER_THRESHOLD', 5)),
+            reset_timeout=env_float('API_BREAKER_RESET', 30),
+        )
+    return _circuit
+
+
+def api_stats():
+    """Return the schedule cache counters and the circuit breaker state."""
+    stats = schedule_cache_stats()
+    stats['not_modified'] = _not_modified
+    stats['circuit'] = circuit().stats()
+    return stats
+
+
+def _retryable_status(status):
+    # Timeouts, rate limiting and server-side errors may go away; other 4xx won't
+    return status in (408, 429) or status >= 500
+
+
+def _backoff(attempt, retry_after=None):
+    """Delay before retry number attempt + 1: full jitter over an exponential cap.
+
+    Tuned with API_BACKOFF_BASE (default 0.5s) and API_BACKOFF_MAX (default 10s),
+    which also caps a server's Retry-After.
+    """
+    backoff_max = env_float('API_BACKOFF_MAX', 10)
+    if retry_after is not None:
+        return min(retry_after, backoff_max)
+    cap = min(backoff_max, env_float('API_BACKOFF_BASE', 0.5) * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _get_json(url, max_retries=3, payload=None, deadline=None):
+    """GET a JSON document from the API over the shared session (see _request_json)."""
+    data, _ = await _request_json(url, max_retries, payload, deadline)
+    return data
+
+
+async def _request_json(url, max_retries=3, payload=None, deadline=None, validators=None):
+    """GET a JSON document from the API over the shared session.
+
+    When payload is given it is POSTed as JSON instead. Network errors and
+    retryable statuses (408, 429, 5xx) are retried with jittered exponential
+    backoff, and count against the circuit breaker; other statuses fail at
+    once. Nothing is attempted while the circuit is open.
+
+    Args:
+        url: Request URL
+        max_retries: Total attempts
+        payload: JSON body, switching the request to POST
+        deadline: time.monotonic() value after which no attempt or wait starts;
+            each request's timeout is also cut down to fit before it
+        validators: Validators of the response already held, if any. The
+            request is then made conditional, and _NOT_MODIFIED is returned
+            on a 304 or when the body hashes the same as before
+
+    Returns:
+        (data, validators) tuple, data being the parsed JSON or _NOT_MODIFIED
+
+    Raises:
+        CircuitOpenError: The circuit is open
+        APIError: The request failed for good
+    """
+    session = await get_session()
+    breaker = circuit()
+    method = 'GET' if payload is None else 'POST'
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
     for attempt in range(max_retries):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise APIError("API deadline exceeded")
+        if not breaker.allow():
+            raise CircuitOpenError(f"API circuit open, retry in {breaker.retry_in():.0f}s")
+
+        retry_after = None
+        outcome_recorded = False
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data
-                    else:
-                        logging.error(f"API request failed with status {response.status}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                            continue
-                        raise Exception(f"API request failed with status {response.status}")
-        except aiohttp.ClientError as e:
-            logging.error(f"Network error on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                continue
-            raise Exception(f"Failed to connect to API after {max_retries} attempts: {str(e)}")
-        except Exception as e:
-            logging.error(f"Unexpected error on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1 * (attempt + 1))
-                continue
-            raise
-    
-    raise Exception("Failed to fetch day schedule after all retry attempts")
-
-async def fetch_week_schedule(user, date=None, max_retries=3):
-    """Fetch schedule for an entire week"""
+            # Always pass an explicit timeout: None would disable it instead of
+            # falling back to the session's API_TIMEOUT
+            timeout = env_float('API_TIMEOUT', 30)
+            if remaining is not None:
+                timeout = min(remaining, timeout)
+            async with session.request(
+                method, url, json=payload, headers=headers, timeout=ClientTimeout(total=timeout)
+            ) as response:
+                if response.status == 304 and validators:
+                    breaker.record_success()
+                    outcome_recorded = True
+                    # A 304 may carry updated validators for the same body
+                    refreshed = dict(validators)
+                    if response.headers.get('ETag'):
+                        refreshed['etag'] = response.headers['ETag']
+                    if response.headers.get('Last-Modified'):
+                        refreshed['last_modified'] = response.headers['Last-Modified']
+                    return _NOT_MODIFIED, refreshed
+                if response.status == 200:
+                    body = await response.read()
+                    breaker.record_success()
+                    outcome_recorded = True
+                    received = {
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'body_hash': hashlib.sha256(body).hexdigest(),
+                    }
+                    # Upstreams without validators still send the same bytes for an unchanged schedule
+                    if validators and received['body_hash'] == validators.get('body_hash'):
+                        return _NOT_MODIFIED, received
+                    return json.loads(body), received
+                error = APIError(f"API request failed with status {response.status}", response.status)
+                retryable = _retryable_status(response.status)
+                retry_after = _retry_after(response) if response.status == 429 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = APIError(f"Network error: {str(e) or type(e).__name__}")
+            retryable = True
+        finally:
+            if not outcome_recorded:
+                breaker.release()
+
+        if not retryable:
+            # The API answered: it is up, the request itself is wrong
+            breaker.record_success()
+            logging.error(f"{error}, not retrying")
+            raise error
+
+        breaker.record_failure()
+        logging.error(f"{error} on attempt {attempt + 1}")
+        if attempt == max_retries - 1:
+            raise error
+        # Waiting less than a server asks for would only be rate limited again,
+        # and waiting longer would outlive the interaction: give up now
+        if retry_after is not None and retry_after > env_float('API_BACKOFF_MAX', 10):
+            raise APIError(f"{error}, server asked to retry in {retry_after:.0f}s", error.status)
+        delay = _backoff(attempt, retry_after)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise error
+        await asyncio.sleep(delay)
+
+    raise APIError("Failed to fetch schedule after all retry attempts")
+
+
+async def fetch_schedule(user, start_time=None, end_time=None, max_retries=3):
+    """Legacy function, kept for backward compatibility"""
+    return await fetch_week_schedule(user, start_time, max_retries)
+
+async def fetch_day_schedule(user, date=None, max_retries=3, use_cache=True):
+    """Fetch schedule for a specific day (use_cache=False forces an upstream call)"""
+    logging.info(f"Fetching day schedule for user {user}, date: {date}")
+    return await _fetch_cached(user, _format_date(date), "day", max_retries, use_cache)
+
+async def fetch_week_schedule(user, date=None, max_retries=3, use_cache=True):
+    """Fetch schedule for an entire week (use_cache=False forces an upstream call)"""
     logging.info(f"Fetching week schedule for user {user}, date: {date}")
-    base_url = os.getenv('API_URL', 'https://epsi.enzomtp.party')
-    
-    # If no date provided, use current date
-    if date is None:
-        date_obj = datetime.now()
+    return await _fetch_cached(user, _format_date(date), "week", max_retries, use_cache)
+
+
+async def serve_day_schedule(user, date=None, max_retries=3):
+    """Fetch a day's schedule for an interactive reply, falling back to stale data.
+
+    Returns:
+        (schedule, is_stale) tuple, see _serve
+    """
+    logging.info(f"Serving day schedule for user {user}, date: {date}")
+    return await _serve(user, _format_date(date), "day", max_retries)
+
+async def serve_week_schedule(user, date=None, max_retries=3):
+    """Fetch a week's schedule for an interactive reply, falling back to stale data.
+
+    Returns:
+        (schedule, is_stale) tuple, see _serve
+    """
+    logging.info(f"Serving week schedule for user {user}, date: {date}")
+    return await _serve(user, _format_date(date), "week", max_retries)
+
+
+def _log_background_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"Background schedule refresh failed: {task.exception()}")
+
+
+async def _serve(user, formatted_date, scope, max_retries):
+    """Stale-while-revalidate lookup of (user, date, scope).
+
+    A fresh cache entry is returned as is. Otherwise the upstream is called,
+    and if a last good response exists it is returned instead as soon as the
+    call fails or takes longer than API_STALE_BUDGET seconds (default 0.05).
+    The call then keeps running in the background and refreshes the caches
+    for the next request.
+
+    Returns:
+        (schedule, is_stale) tuple, is_stale being True when the last good
+        response was served instead of a fresh one
+
+    Raises:
+        APIError: The upstream failed and no last good response exists
+    """
+    key = (user, formatted_date, scope)
+    cached = schedule_cache().get(key)
+    if cached is not None:
+        logging.info(f"Cache hit for {key}")
+        return cached, False
+
+    refresh = asyncio.ensure_future(_inflight.do(key, lambda: _fetch_and_store(key, max_retries)))
+    stale = last_good_cache().get(key)
+    if stale is None:
+        return await refresh, False
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(refresh), env_float('API_STALE_BUDGET', 0.05)), False
+    except Exception as e:
+        reason = "too slow" if isinstance(e, asyncio.TimeoutError) else str(e)
+        logging.warning(f"Serving stale schedule for {key} ({reason})")
+        refresh.add_done_callback(_log_background_failure)
+        return stale, True
+
+
+async def _fetch_cached(user, formatted_date, scope, max_retries, use_cache=True, deadline=None):
+    """Serve (user, date, scope) from the cache, or from one shared upstream call.
+
+    Concurrent misses for the same key join the same in-flight request, so a
+    burst of identical /week commands costs a single API call. With
+    use_cache=False the cache is not read but is still refreshed.
+    """
+    key = (user, formatted_date, scope)
+
+    if use_cache:
+        cached = schedule_cache().get(key)
+        if cached is not None:
+            logging.info(f"Cache hit for {key}")
+            return cached
+
+    return await _inflight.do(key, lambda: _fetch_and_store(key, max_retries, deadline))
+
+
+def _base_url():
+    return os.getenv('API_URL', 'https://epsi.enzomtp.party')
+
+
+def _store(key, data, validators=None):
+    """Normalize an API response for key, cache it and return it."""
+    user, formatted_date, scope = key
+    if scope == "week":
+        # Flatten the nested array and filter out empty days
+        flattened_data = []
+        for day in data:
+            if day and any(course.get('name') for course in day):
+                flattened_data.extend(day)
+        data = flattened_data
+
+    return _remember(key, data, validators)
+
+
+def _remember(key, data, validators=None):
+    """Cache an already normalized schedule for key in every tier and return it."""
+    user, formatted_date, scope = key
+    schedule_cache().set(key, data, _schedule_ttl(formatted_date, scope))
+    last_good_cache().set(key, data)
+    if validators:
+        validator_cache().set(key, validators)
     else:
-        # Parse the date string into a datetime object
-        date_obj = datetime.strptime(date, "%d/%m/%Y")
-    
-    # Format the date as DD-MM-YYYY for the API request
-    formatted_date = date_obj.strftime("%d-%m-%Y")
-    
-    url = f"{base_url}/week/{formatted_date}?user={user}"
+        # The validators of an older response would revalidate against it
+        # while the caches now hold this one (e.g. after a batch fetch)
+        validator_cache().invalidate(key)
+    persistent_store.save_schedule(key, data, validators)
+    return data
+
+
+async def load_persisted_schedules():
+    """Warm the schedule caches from the persistent store after a restart.
+
+    Entries are aged by their fetch time: still-fresh ones go back into the
+    schedule cache, and all of them into the last good store.
+
+    Returns:
+        Number of schedules loaded
+    """
+    rows = await persistent_store.load_schedules()
+    now = time.time()
+    stale_cache = last_good_cache()
+    for key, data, validators, fetched_at in rows:
+        age = now - fetched_at
+        stale_cache.set(key, data, stale_cache.default_ttl - age)
+        schedule_cache().set(key, data, _schedule_ttl(key[1], key[2]) - age)
+        if validators:
+            validator_cache().set(key, validators, stale_cache.default_ttl - age)
+    if rows:
+        logging.info(f"Loaded {len(rows)} persisted schedule(s)")
+    return len(rows)
+
+
+async def _fetch_and_store(key, max_retries, deadline=None):
+    global _not_modified
+    user, formatted_date, scope = key
+    if scope == "week":
+        url = f"{_base_url()}/week/{formatted_date}?user={user}"
+    else:
+        url = f"{_base_url()}/{formatted_date}?user={user}"
     logging.info(f"Requesting URL: {url}")
-    
-    timeout = ClientTimeout(total=30)  # 30 seconds timeout
-    
-    for attempt in range(max_retries):
+
+    # Only revalidate what can be served back on a 304
+    previous = last_good_cache().get(key)
+    validators = validator_cache().get(key) if previous is not None else None
+    data, validators = await _request_json(url, max_retries, deadline=deadline, validators=validators)
+    if data is _NOT_MODIFIED:
+        # Reuse the previous schedule: no parsing or flattening. Renders still
+        # hash it, but land on the content-addressed image rendered before.
+        _not_modified += 1
+        logging.info(f"Schedule unchanged for {key}")
+        return _remember(key, previous, validators)
+    return _store(key, data, validators)
+
+
+async def _fetch_batch(users, formatted_date, scope, max_retries, deadline=None):
+    """Fetch many users' schedules with one call to the multi-user endpoint.
+
+    The endpoint (API_URL + API_BATCH_PATH) receives a JSON body
+    {"date": "DD-MM-YYYY", "scope": "day"|"week", "users": [...]} and answers
+    a JSON object mapping each username to the same document as the per-user
+    endpoint. Users missing from the answer are left out of the result.
+
+    Returns:
+        Dict of username -> normalized schedule
+    """
+    url = f"{_base_url()}{os.getenv('API_BATCH_PATH')}"
+    logging.info(f"Requesting batch of {len(users)} {scope} schedule(s) for {formatted_date}")
+    payload = {'date': formatted_date, 'scope': scope, 'users': users}
+    data = await _get_json(url, max_retries, payload=payload, deadline=deadline)
+    return {
+        user: _store((user, formatted_date, scope), data[user])
+        for user in users if data.get(user) is not None
+    }
+
+
+_BATCH_END = object()
+
+
+async def fetch_schedules(users, date=None, scope="day", max_retries=3, use_cache=True, budget=None):
+    """Fetch the schedules of many users for one date, yielding them as they complete.
+
+    users may be a list or an async iterable (e.g. a stream of subscribers),
+    consumed while earlier results are already being yielded. Cached users are
+    answered right away. If API_BATCH_PATH is set, the others are fetched
+    API_BATCH_SIZE (default 50) at a time from the multi-user endpoint, falling
+    back to per-user calls for anything the batch did not answer. Otherwise up
+    to API_BATCH_CONCURRENCY (default 20) per-user requests are pipelined over
+    the shared connection pool.
+
+    Args:
+        users: Iterable or async iterable of usernames
+        date: Date in format DD/MM/YYYY (optional, today by default)
+        scope: "day" or "week"
+        max_retries: Attempts per upstream request
+        use_cache: False forces upstream calls (the cache is still refreshed)
+        budget: Seconds the whole batch may spend on upstream calls; requests
+            that would start or wait past it fail with APIError instead
+
+    Yields:
+        (username, schedule) tuples, or (username, exception) when that
+        user's fetch failed
+    """
+    formatted_date = _format_date(date)
+    deadline = None if budget is None else time.monotonic() + budget
+    batch_path = os.getenv('API_BATCH_PATH')
+    batch_size = max(1, env_int('API_BATCH_SIZE', 50))
+    slots = asyncio.Semaphore(max(1, env_int('API_BATCH_CONCURRENCY', 20)))
+    results = asyncio.Queue()
+    tasks = set()
+
+    async def fetch_one(user):
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Flatten the nested array and filter out empty days
-                        flattened_data = []
-                        for day in data:
-                            if day and any(course.get('name') for course in day):
-                                flattened_data.extend(day)
-                        return flattened_data
-                    else:
-                        logging.error(f"API request failed with status {response.status}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                            continue
-                        raise Exception(f"API request failed with status {response.status}")
-        except aiohttp.ClientError as e:
-            logging.error(f"Network error on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                continue
-            raise Exception(f"Failed to connect to API after {max_retries} attempts: {str(e)}")
+            data = await _fetch_cached(user, formatted_date, scope, max_retries, use_cache=False, deadline=deadline)
         except Exception as e:
-            logging.error(f"Unexpected error on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1 * (attempt + 1))
-                continue
-            raise
-    
-    raise Exception("Failed to fetch week schedule after all retry attempts")
\ No newline at end of file
+            data = e
+        await results.put((user, data))
+
+    async def fetch_many(chunk):
+        try:
+            found = await _fetch_batch(chunk, formatted_date, scope, max_retries, deadline)
+        except Exception as e:
+            logging.warning(f"Batch request failed, falling back to per-user requests: {e}")
+            found = {}
+        for user, data in found.items():
+            await results.put((user, data))
+        missing = [user for user in chunk if user not in found]
+        if missing:
+            # Started apart from this call, which holds a slot: the per-user
+            # requests wait for slots of their own like any other
+            track(asyncio.create_task(fall_back(missing)))
+
+    async def fall_back(missing):
+        for user in missing:
+            await spawn(fetch_one(user))
+
+    def track(task):
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def spawn(coro):
+        # Waiting for a free slot here also slows down reading users
+        await slots.acquire()
+        task = asyncio.create_task(coro)
+        track(task)
+        task.add_done_callback(lambda t: slots.release())
+
+    async def produce():
+        error = None
+        pending = []
+
+        async def submit(user):
+            nonlocal pending
+            if use_cache:
+                cached = schedule_cache().get((user, formatted_date, scope))
+                if cached is not None:
+                    await results.put((user, cached))
+                    return
+            if not batch_path:
+                await spawn(fetch_one(user))
+                return
+            pending.append(user)
+            if len(pending) >= batch_size:
+                await spawn(fetch_many(pending))
+                pending = []
+
+        try:
+            if hasattr(users, '__aiter__'):
+                async for user in users:
+                    await submit(user)
+            else:
+                for user in users:
+                    await submit(user)
+            if pending:
+                await spawn(fetch_many(pending))
+        except Exception as e:
+            error = e
+        # Batch fallbacks keep adding tasks until every user is answered
+        while tasks:
+            await asyncio.gather(*tasks)
+        await results.put((_BATCH_END, error))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            user, data = await results.get()
+            if user is _BATCH_END:
+                if data is not None:
+                    raise data
+                return
+            yield user, data
+    finally:
+        if not producer.done():
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(producer, *tasks, return_exceptions=True)
@@ -0,0 +1,203 @@
+"""In-process caches shared by the API and rendering layers.
+
+Everything here runs on the bot's event loop thread, so no locking is needed.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a per-entry time-to-live.
+
+    Args:
+        max_entries: Maximum number of entries kept before the least recently
+            used one is evicted
+        default_ttl: TTL in seconds used when set() is called without one
+        clock: Monotonic time source, overridable for tests
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl seconds (default_ttl if None)."""
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key from the cache if present."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry, keeping the counters."""
+        self._entries.clear()
+
+    def stats(self):
+        """Return the cache counters as a dict, for logging and sizing."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task. The key is released as soon as the task
+    finishes, so a failure is delivered to every waiter of that flight but the
+    next call starts a fresh attempt.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, factory):
+        """Run factory() for key unless an identical call is already running.
+
+        Args:
+            key: Hashable identity of the call
+            factory: Zero-argument callable returning the coroutine to run
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        else:
+            self.shared += 1
+
+        # Shield so that one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the outcome as seen: if every waiter was cancelled, asyncio would
+        # otherwise log "Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Return the number of calls and how many joined an existing flight."""
+        return {'calls': self.calls, 'shared': self.shared, 'in_flight': len(self._inflight)}
+
+
+class ByteLRUCache:
+    """LRU cache of bytes values bounded by their total size.
+
+    Args:
+        max_bytes: Total size of the stored values before the least recently
+            used ones are evicted. Values larger than this are not stored.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_held = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the bytes stored under key, or None."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store value under key, evicting old entries to stay within budget."""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes_held -= len(previous)
+
+        self._entries[key] = value
+        self.bytes_held += size
+        while self.bytes_held > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes_held -= len(evicted)
+            self.evictions += 1
+
+    def stats(self):
+        """Return the cache counters as a dict, for logging and sizing."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'bytes_held': self.bytes_held,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
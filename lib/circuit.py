@@ -0,0 +1,93 @@
+"""Circuit breaker guarding calls to an unreliable upstream.
+
+After `failure_threshold` consecutive failures the circuit opens and calls
+fail fast instead of waiting on timeouts. Once `reset_timeout` seconds have
+passed, a single probe call is let through (half-open): its success closes
+the circuit, its failure opens it again for another period.
+"""
+
+import logging
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Callers ask allow() before each call and report the outcome with
+    record_success() or record_failure(); a call that ends without an outcome
+    (e.g. cancelled) must call release() so a half-open probe is not lost.
+    Not thread-safe: meant to be used from the event loop.
+
+    Args:
+        name: Name used in log messages
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a probe
+        clock: Monotonic time source, injectable for tests
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def _set_state(self, state):
+        if state != self.state:
+            log = logging.warning if state == OPEN else logging.info
+            log(f"Circuit {self.name} {self.state} -> {state}")
+            self.state = state
+
+    def allow(self):
+        """Return True if a call may go through now."""
+        if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a probe through (0 if not open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        self._failures = 0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self._opened_at = self._clock()
+            self._set_state(OPEN)
+
+    def release(self):
+        """Give back a half-open probe slot without reporting an outcome."""
+        self._probing = False
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'opened': self.opened,
+            'rejected': self.rejected,
+        }
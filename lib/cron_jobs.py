@@ -1,104 +1,362 @@
-from lib.user_manager import get_users_with_preference
-from lib.schedule_utils import day_schedule_image, week_schedule_image
-from lib.api import fetch_day_schedule, fetch_week_schedule
-import logging, time, io
+from lib.user_store import iter_subscribers, set_dm_channel
+from lib.renderer import render_day_image, render_week_image
+from lib.render_cache import schedule_hash
+from lib.api import fetch_schedules, api_stats
+from lib import dispatch, persistent_store, render_cache
+from lib.env import env_int, env_float
+from dataclasses import dataclass
+from typing import Callable
+import logging, time, io, asyncio
 import discord
 
 
+# Outcomes counted in the job summary
+SENT = "sent"
+FAILED = "failed"
+FORBIDDEN = "forbidden"
+EMPTY = "empty"
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    """What a notification job fetches, renders and sends."""
+
+    preference: str
+    label: str
+    scope: str
+    render: Callable
+    content: str
+    filename_prefix: str
+
+
+JOBS = {
+    "daily": JobSpec(
+        preference="daily",
+        label="quotidien",
+        scope="day",
+        render=render_day_image,
+        content="Voici l'emploi du temps du jour",
+        filename_prefix="emploi_du_temps",
+    ),
+    "weekly": JobSpec(
+        preference="weekly",
+        label="hebdomadaire",
+        scope="week",
+        render=render_week_image,
+        content="Voici l'emploi du temps de la semaine",
+        filename_prefix="emploi_semaine",
+    ),
+}
+
+# Staging store filled by prepare_job and emptied by deliver_job:
+# job name -> {'date', 'groups', 'summary'}
+_staged = {}
+# One lock per job, so a delivery waits for a prefetch or revalidation in progress
+_locks = {}
+
+
+def _fetch_budget():
+    """Seconds a job may spend fetching schedules (CRON_FETCH_BUDGET, default 600)."""
+    return env_float('CRON_FETCH_BUDGET', 600.0)
+
+
+def _concurrency():
+    """Number of users processed in parallel by a job (CRON_CONCURRENCY, default 10)."""
+    return max(1, env_int('CRON_CONCURRENCY', 10))
+
+
 async def run_daily_job(bot: discord.Client):
     """Run the daily job to send notifications to users with daily reminders enabled.
 
     Args:
         bot: The discord.py Bot/Client instance used to fetch users and send DMs.
     """
+    await run_job(bot, "daily")
 
-    users = get_users_with_preference("daily")
-    logging.info(f"Lancement du travail quotidien pour {len(users)} utilisateur(s) avec des rappels quotidiens activés.")
-    for user in users:
-        try:
-            # Fetch schedule data from the API
-            schedule_data = await fetch_day_schedule(user.username, time.strftime("%d/%m/%Y"))
+async def run_weekly_job(bot: discord.Client):
+    """Run the weekly job to send notifications to users with weekly reminders enabled.
 
-            # Generate image bytes
-            success, result = day_schedule_image(schedule_data)
+    Args:
+        bot: The discord.py Bot/Client instance used to fetch users and send DMs.
+    """
+    await run_job(bot, "weekly")
 
-            if not success:
-                logging.error(f"Erreur lors de la génération de l'image pour {user.username}: {result}")
-                continue
 
-            image_bytes = result
+async def run_job(bot: discord.Client, name):
+    """Prepare and immediately deliver a job, without a prefetch window."""
+    await prepare_job(name)
+    return await deliver_job(bot, name)
 
-            # Prepare in-memory file
-            bio = io.BytesIO(image_bytes)
-            bio.seek(0)
-            filename = f"emploi_du_temps_{user.id}.png"
 
-            # Try to get the Discord user (from cache first, then via API)
-            discord_user = bot.get_user(user.id)
-            if discord_user is None:
-                try:
-                    discord_user = await bot.fetch_user(user.id)
-                except Exception as e:
-                    logging.exception(f"Impossible de récupérer l'utilisateur Discord {user.id}: {e}")
-                    continue
+async def _pool(items, handler, workers):
+    """Run handler(item) for every item of a (sync or async) iterable with bounded concurrency."""
+    queue = asyncio.Queue(maxsize=workers * 2)
 
-            # Send DM with the image
-            try:
-                await discord_user.send(content="Voici l'emploi du temps du jour", file=discord.File(fp=bio, filename=filename))
-                logging.info(f"Emploi du temps envoyé à {user.username} ({user.id})")
-            except discord.Forbidden:
-                logging.warning(f"Impossible d'envoyer un DM à {user.username} ({user.id}) : autorisation refusée")
-            except Exception as e:
-                logging.exception(f"Échec de l'envoi du DM à {user.username} ({user.id}) : {e}")
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await handler(item)
 
-        except Exception as e:
-            logging.exception(f"Erreur lors de la récupération de l'emploi du temps pour {user.username}: {e}")
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                await queue.put(item)
+        else:
+            for item in items:
+                await queue.put(item)
+    finally:
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+
+
+def _lock(name):
+    if name not in _locks:
+        _locks[name] = asyncio.Lock()
+    return _locks[name]
 
-async def run_weekly_job(bot: discord.Client):
-    """Run the weekly job to send notifications to users with weekly reminders enabled.
+
+async def prepare_job(name, refresh=False):
+    """Fetch and render every subscriber's schedule into the staging store.
+
+    Subscribers are grouped by a hash of their normalized schedule and each
+    distinct schedule is rendered once. When a job for today is already
+    staged, images of unchanged schedules are reused, so calling this again
+    with refresh=True (bypassing the schedule cache) revalidates the staged
+    job: only schedules that changed upstream are re-rendered, and users who
+    subscribed in the meantime are picked up.
 
     Args:
-        bot: The discord.py Bot/Client instance used to fetch users and send DMs.
+        name: Job name, a key of JOBS
+        refresh: Force upstream fetches instead of using the schedule cache
     """
+    async with _lock(name):
+        await _prepare(name, refresh)
 
-    users = get_users_with_preference("weekly")
-    logging.info(f"Lancement du travail hebdomadaire pour {len(users)} utilisateur(s) avec des rappels hebdomadaires activés.")
-    for user in users:
-        try:
-            # Fetch weekly schedule data from the API
-            schedule_data = await fetch_week_schedule(user.username, time.strftime("%d/%m/%Y"))
 
-            # Generate image bytes for the week
-            success, result = week_schedule_image(schedule_data)
+async def _prepare(name, refresh=False):
+    spec = JOBS[name]
+    started = time.monotonic()
+    date = time.strftime("%d/%m/%Y")
+    summary = {SENT: 0, FAILED: 0, FORBIDDEN: 0, EMPTY: 0}
+    workers = _concurrency()
 
-            if not success:
-                logging.error(f"Erreur lors de la génération de l'image (semaine) pour {user.username}: {result}")
-                continue
+    previous = _staged.get(name)
+    previous_groups = previous['groups'] if previous and previous['date'] == date else {}
+    previous_keys = {
+        member[0]: key
+        for key, group in previous_groups.items()
+        for member in group['members']
+    }
 
-            image_bytes = result
+    logging.info(f"Préparation du travail {spec.label} pour les utilisateurs avec des rappels activés.")
 
-            # Prepare in-memory file
-            bio = io.BytesIO(image_bytes)
-            bio.seek(0)
-            filename = f"emploi_semaine_{user.id}.png"
+    # 1. Fetch subscribers' schedules as they stream in and group identical ones;
+    # 2. render each distinct schedule once, as soon as it appears, reusing
+    #    images staged earlier
+    groups = {}
+    render_slots = asyncio.Semaphore(workers)
+    renders = []
 
-            # Try to get the Discord user (from cache first, then via API)
-            discord_user = bot.get_user(user.id)
-            if discord_user is None:
-                try:
-                    discord_user = await bot.fetch_user(user.id)
-                except Exception as e:
-                    logging.exception(f"Impossible de récupérer l'utilisateur Discord {user.id}: {e}")
-                    continue
-
-            # Send DM with the image
+    async def render_one(group):
+        async with render_slots:
             try:
-                await discord_user.send(content="Voici l'emploi du temps de la semaine", file=discord.File(fp=bio, filename=filename))
-                logging.info(f"Emploi du temps (semaine) envoyé à {user.username} ({user.id})")
-            except discord.Forbidden:
-                logging.warning(f"Impossible d'envoyer un DM à {user.username} ({user.id}) : autorisation refusée")
+                success, result = await spec.render(group['schedule'])
             except Exception as e:
-                logging.exception(f"Échec de l'envoi du DM à {user.username} ({user.id}) : {e}")
+                success, result = False, str(e)
+        if success:
+            group['image'] = result
+        else:
+            logging.error(f"Erreur lors de la génération de l'image pour {len(group['members'])} utilisateur(s): {result}")
+
+    def place(subscriber, schedule_data):
+        user_id, username, _ = subscriber
+        if isinstance(schedule_data, Exception):
+            key = previous_keys.get(user_id)
+            if key is None:
+                logging.error(f"Erreur lors de la récupération de l'emploi du temps pour {username}: {schedule_data}")
+                summary[FAILED] += 1
+                return
+            # Revalidation failed: keep what was staged for this user
+            logging.warning(f"Revalidation impossible pour {username}, conservation de la version préparée : {schedule_data}")
+            schedule_data = previous_groups[key]['schedule']
+        else:
+            key = schedule_hash(schedule_data) if schedule_data else None
+        if not schedule_data:
+            logging.info(f"Aucun cours pour {username} ({user_id}), pas d'envoi")
+            summary[EMPTY] += 1
+            return
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'schedule': schedule_data, 'members': []}
+            if 'image' in previous_groups.get(key, {}):
+                group['image'] = previous_groups[key]['image']
+            else:
+                renders.append(asyncio.create_task(render_one(group)))
+        group['members'].append(subscriber)
+
+    # Subscribers sharing a username are fetched once
+    waiting = {}
+    fetched = {}
 
-        except Exception as e:
-            logging.exception(f"Erreur lors de la récupération de l'emploi du temps (semaine) pour {user.username}: {e}")
+    async def usernames():
+        async for subscriber in iter_subscribers(spec.preference):
+            username = subscriber[1]
+            if username in fetched:
+                place(subscriber, fetched[username])
+            elif username in waiting:
+                waiting[username].append(subscriber)
+            else:
+                waiting[username] = [subscriber]
+                yield username
+
+    try:
+        async for username, schedule_data in fetch_schedules(
+            usernames(), date, spec.scope, use_cache=not refresh, budget=_fetch_budget()
+        ):
+            fetched[username] = schedule_data
+            for subscriber in waiting.pop(username, []):
+                place(subscriber, schedule_data)
+    except Exception as e:
+        logging.exception(f"Erreur lors de la lecture des abonnés du travail {spec.label}: {e}")
+        # Users whose fetch never completed fall back like failed fetches
+        for subscribers in waiting.values():
+            for subscriber in subscribers:
+                place(subscriber, e)
+
+    await asyncio.gather(*renders)
+    # Members may have joined a group after its render failed: count them all now
+    summary[FAILED] += sum(len(group['members']) for group in groups.values() if 'image' not in group)
+
+    _staged[name] = {'date': date, 'groups': groups, 'summary': summary}
+
+    users = sum(len(group['members']) for group in groups.values())
+    logging.info(
+        f"Travail {spec.label} préparé en {time.monotonic() - started:.1f}s : {len(groups)} image(s) "
+        f"distincte(s) pour {users} utilisateur(s), {len(renders)} rendue(s)"
+        + (" après revalidation" if refresh else "")
+    )
+    logging.info(f"État de l'API d'emploi du temps : {api_stats()}")
+    logging.info(f"Cache des images : {render_cache.stats()}")
+    logging.info(f"Stockage persistant : {await persistent_store.stats()}")
+
+
+async def revalidate_job(name):
+    """Re-fetch a staged job from upstream and re-render the schedules that changed."""
+    if name not in _staged:
+        logging.warning(f"Aucune préparation à revalider pour le travail {JOBS[name].label}")
+        return
+    await prepare_job(name, refresh=True)
+
+
+async def deliver_job(bot: discord.Client, name):
+    """DM the staged images of a job to their subscribers and clear the staging store.
+
+    If nothing was staged for today (e.g. the bot restarted after the
+    prefetch), the job is prepared on the spot first.
+
+    Returns:
+        The job summary dict
+    """
+    async with _lock(name):
+        return await _deliver(bot, name)
+
+
+async def _deliver(bot, name):
+    spec = JOBS[name]
+    workers = _concurrency()
+
+    staged = _staged.get(name)
+    if staged is None or staged['date'] != time.strftime("%d/%m/%Y"):
+        logging.warning(f"Aucune préparation pour le travail {spec.label}, préparation immédiate")
+        await _prepare(name)
+
+    started = time.monotonic()
+    staged = _staged.pop(name)
+    groups = staged['groups']
+    summary = staged['summary']
+
+    # Send the shared bytes to every member
+    deliveries = (
+        (member, group['image'])
+        for group in groups.values() if 'image' in group
+        for member in group['members']
+    )
+
+    async def send_one(delivery):
+        subscriber, image_bytes = delivery
+        outcome = await _send_image(bot, subscriber, image_bytes, spec.content, spec.filename_prefix)
+        summary[outcome] += 1
+
+    await _pool(deliveries, send_one, workers)
+
+    duration = time.monotonic() - started
+    users = sum(len(group['members']) for group in groups.values())
+    dedup_ratio = users / len(groups) if groups else 0.0
+    logging.info(
+        f"Travail {spec.label} livré en {duration:.1f}s pour {sum(summary.values())} utilisateur(s) : "
+        f"{summary[SENT]} envoyé(s), {summary[FAILED]} échec(s), {summary[FORBIDDEN]} refusé(s), "
+        f"{summary[EMPTY]} sans cours ; {len(groups)} image(s) distincte(s) pour {users} utilisateur(s) "
+        f"(déduplication x{dedup_ratio:.1f}, {workers} en parallèle)"
+    )
+    logging.info(f"File d'envoi Discord : {dispatch.get_queue().stats()}")
+    return summary
+
+
+async def _dm_channel(bot, user_id, channel_id):
+    """Return a messageable DM channel for a user, opening and remembering it if needed.
+
+    A known channel ID is used as a partial messageable, which costs no API
+    call; otherwise the user is looked up (cache first, then API), the DM
+    channel is opened and its ID is stored for the next runs.
+    """
+    if channel_id:
+        return bot.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+
+    discord_user = bot.get_user(user_id)
+    if discord_user is None:
+        discord_user = await bot.fetch_user(user_id)
+    channel = discord_user.dm_channel or await dispatch.send(discord_user.create_dm, dispatch.BACKGROUND)
+    if not await set_dm_channel(user_id, channel.id):
+        logging.warning(f"Impossible d'enregistrer le salon DM de l'utilisateur {user_id}")
+    return channel
+
+
+async def _send_image(bot, subscriber, image_bytes, content, filename_prefix):
+    """DM an image to one subscriber and return the outcome counted in the job summary."""
+    user_id, username, channel_id = subscriber
+    filename = f"{filename_prefix}_{user_id}.png"
+
+    try:
+        channel = await _dm_channel(bot, user_id, channel_id)
+    except Exception as e:
+        logging.exception(f"Impossible d'ouvrir le salon DM de l'utilisateur Discord {user_id}: {e}")
+        return FAILED
+
+    # Send DM with the image through the rate-limited delivery queue; a fresh
+    # in-memory file is built on every attempt since discord.File is consumed
+    def send():
+        return channel.send(content=content, file=discord.File(fp=io.BytesIO(image_bytes), filename=filename))
+
+    try:
+        try:
+            await dispatch.send(send, dispatch.BACKGROUND)
+        except discord.NotFound:
+            if not channel_id:
+                raise
+            # The stored channel is gone: forget it and open a new one
+            logging.info(f"Salon DM enregistré introuvable pour {username} ({user_id}), réouverture")
+            await set_dm_channel(user_id, None)
+            channel = await _dm_channel(bot, user_id, None)
+            await dispatch.send(send, dispatch.BACKGROUND)
+        logging.info(f"Emploi du temps envoyé à {username} ({user_id})")
+        return SENT
+    except discord.Forbidden:
+        logging.warning(f"Impossible d'envoyer un DM à {username} ({user_id}) : autorisation refusée")
+        return FORBIDDEN
+    except Exception as e:
+        logging.exception(f"Échec de l'envoi du DM à {username} ({user_id}) : {e}")
+        return FAILED
@@ -1,26 +1,84 @@
-from peewee import PostgresqlDatabase, Model, CharField, BooleanField, BigIntegerField
+from peewee import Model, CharField, BooleanField, BigIntegerField, OperationalError, InterfaceError
+from playhouse.pool import PooledPostgresqlExtDatabase, PooledSqliteDatabase
 import dotenv
+import logging
 import os
+from lib.env import env_int
 
 dotenv.load_dotenv()
 
 
-db_name = os.getenv('POSTGRES_DB')
-db_user = os.getenv('POSTGRES_USER')
-db_password = os.getenv('POSTGRES_PASSWORD')
-db_host = os.getenv('POSTGRES_HOST')
-db_port = int(os.getenv('POSTGRES_PORT'))
+class ReconnectReadsMixin:
+    """Retry a read once on a fresh connection when the current one is dead.
 
-if not all([db_name, db_user, db_password, db_host, db_port]):
-    raise ValueError("Database configuration environment variables are not fully set.")
+    Pooled connections can be closed behind our back (database restart, idle
+    timeout). A SELECT outside of a transaction is safe to replay, so it is
+    retried on a new connection; anything else is raised to the caller.
 
-db = PostgresqlDatabase(
-    db_name,
-    user=db_user,
-    password=db_password,
-    host=db_host,
-    port=db_port,
-)
+    The pool does not ping connections on checkout, and after a restart every
+    idle connection is as dead as the one that failed, so they are all
+    dropped before retrying: the retry always runs on a freshly opened one.
+    """
+
+    reconnect_errors = (OperationalError, InterfaceError)
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        except self.reconnect_errors as e:
+            if self.in_transaction() or not sql.lstrip().upper().startswith('SELECT'):
+                raise
+            logging.warning(f"Database connection lost ({e}), retrying read on a new connection")
+            if not self.is_closed():
+                # Drop the broken connection instead of returning it to the pool
+                self.manual_close()
+            self.close_idle()
+            return super().execute_sql(sql, params, *args, **kwargs)
+
+
+class ReconnectingPostgresqlDatabase(ReconnectReadsMixin, PooledPostgresqlExtDatabase):
+    pass
+
+
+class ReconnectingSqliteDatabase(ReconnectReadsMixin, PooledSqliteDatabase):
+    pass
+
+
+pool_options = {
+    'max_connections': env_int('DB_MAX_CONNECTIONS', 10),
+    'stale_timeout': env_int('DB_STALE_TIMEOUT', 300),
+    'timeout': env_int('DB_POOL_TIMEOUT', 10),
+}
+
+sqlite_path = os.getenv('SQLITE_DATABASE')
+
+if sqlite_path:
+    # Local stand-in for development and tests, no PostgreSQL server needed.
+    # Pooled connections move between the DB threads of lib.user_store.
+    db = ReconnectingSqliteDatabase(
+        sqlite_path,
+        pragmas={'journal_mode': 'wal'},
+        check_same_thread=False,
+        **pool_options,
+    )
+else:
+    db_name = os.getenv('POSTGRES_DB')
+    db_user = os.getenv('POSTGRES_USER')
+    db_password = os.getenv('POSTGRES_PASSWORD')
+    db_host = os.getenv('POSTGRES_HOST')
+    db_port = os.getenv('POSTGRES_PORT')
+
+    if not all([db_name, db_user, db_password, db_host, db_port]):
+        raise ValueError("Database configuration environment variables are not fully set.")
+
+    db = ReconnectingPostgresqlDatabase(
+        db_name,
+        user=db_user,
+        password=db_password,
+        host=db_host,
+        port=int(db_port),
+        **pool_options,
+    )
 
 
 class User(Model):
@@ -31,18 +89,38 @@ class User(Model):
       - username: user's Discord username
       - daily: whether daily reminders are enabled
       - weekly: whether weekly reminders are enabled
+      - dm_channel_id: ID of the user's DM channel with the bot, once known
     """
 
     id = BigIntegerField(primary_key=True)
     username = CharField()
     daily = BooleanField(default=False)
     weekly = BooleanField(default=False)
+    dm_channel_id = BigIntegerField(null=True)
 
     class Meta:
         database = db
         table_name = 'users'
 
 def initialize_db():
-    """Initialize the database and create tables if they don't exist."""
-    db.connect()
-    db.create_tables([User], safe=True)
\ No newline at end of file
+    """Initialize the database and apply pending schema migrations."""
+    # Imported here because the migrations themselves import the models
+    from lib.migrations import run_migrations
+
+    with db.connection_context():
+        run_migrations()
+
+
+def check_db_health():
+    """Run a trivial query to check that the database is reachable.
+
+    Returns:
+        True if the database answered, False otherwise
+    """
+    try:
+        with db.connection_context():
+            db.execute_sql('SELECT 1')
+        return True
+    except Exception as e:
+        logging.error(f"Database health check failed: {e}")
+        return False
@@ -0,0 +1,214 @@
+"""Outbound Discord delivery queue.
+
+Every message the bot sends in bulk goes through one queue paced by a token
+bucket, so the cron jobs stay under Discord's global rate limit instead of
+running into 429 back-off storms. Sends that discord.py finally gave up on
+because of rate limiting are retried with jittered backoff, and queue depth
+and send latency are tracked.
+
+Replies to slash commands do not go through it: interaction follow-ups are
+webhook calls that don't count against the bot's global rate limit, so
+queueing them behind cron DMs would only delay them.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+
+import discord
+
+from lib.env import env_int, env_float
+
+
+# Priorities, lower is served first (INTERACTIVE is for bot sends a user is waiting on)
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` operations per second with bursts of `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retryable(error):
+    """Whether a failed send is safe and worth retrying.
+
+    discord.py already retries 429s and 5xx internally. Only a rate limit it
+    gave up on is retried here: the message was certainly not posted. A 5xx
+    may have been processed anyway, so retrying it could post it twice.
+    """
+    if isinstance(error, discord.RateLimited):
+        return True
+    return isinstance(error, discord.HTTPException) and error.status == 429
+
+
+class DeliveryQueue:
+    """Priority queue of sends executed by a few workers behind a token bucket.
+
+    Args:
+        rate: Sends per second allowed by the token bucket
+        burst: Bucket capacity
+        workers: Number of sends in flight at once
+        max_retries: Retries of a rate-limited send before giving up
+        base_delay: First retry delay in seconds, doubled on each attempt
+    """
+
+    def __init__(self, rate=40.0, burst=10, workers=8, max_retries=3, base_delay=1.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._tasks = []
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers and cancel every send still queued or in flight."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Nothing will run these anymore: don't leave their submitters waiting
+        while not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            future.cancel()
+            self._queue.task_done()
+
+    async def submit(self, factory, priority=BACKGROUND):
+        """Queue a send and wait for its result.
+
+        Args:
+            factory: Zero-argument callable returning the coroutine that sends.
+                It is called again on each retry, so it must build fresh
+                objects (e.g. a new discord.File) every time.
+            priority: INTERACTIVE or BACKGROUND
+
+        Returns:
+            The result of the send coroutine; its exception is raised instead
+            if it failed for good
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._sequence), time.monotonic(), factory, future))
+        return await future
+
+    async def _worker(self):
+        while True:
+            priority, _, enqueued_at, factory, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    result = await self._send_with_retries(factory)
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.sent += 1
+                    if not future.done():
+                        future.set_result(result)
+                self._latencies.append(time.monotonic() - enqueued_at)
+            except asyncio.CancelledError:
+                # Stopped mid-send
+                future.cancel()
+                raise
+            finally:
+                self._queue.task_done()
+
+    async def _send_with_retries(self, factory):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                return await factory()
+            except Exception as e:
+                if attempt >= self.max_retries or not _retryable(e):
+                    raise
+                self.retries += 1
+                # Only discord.RateLimited says how long to wait
+                wait = e.retry_after if isinstance(e, discord.RateLimited) else self.base_delay * 2 ** attempt
+                # Full jitter, so retries of many senders don't line up
+                delay = wait + random.uniform(0, wait)
+                logging.warning(f"Discord send rate limited, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self):
+        """Return queue depth, counters and send latency percentiles (seconds)."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            'depth': self._queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'latency_p50': percentile(0.50),
+            'latency_p99': percentile(0.99),
+        }
+
+
+_delivery_queue = None
+
+
+def get_queue():
+    """Return the shared delivery queue, configured from the environment.
+
+      - DISCORD_SEND_RATE: sends per second (default 40, under the global 50/s)
+      - DISCORD_SEND_BURST: token bucket capacity (default 10)
+      - DISCORD_SEND_WORKERS: sends in flight at once (default 8)
+    """
+    global _delivery_queue
+    if _delivery_queue is None:
+        _delivery_queue = DeliveryQueue(
+            rate=env_float('DISCORD_SEND_RATE', 40),
+            burst=env_int('DISCORD_SEND_BURST', 10),
+            workers=env_int('DISCORD_SEND_WORKERS', 8),
+        )
+    return _delivery_queue
+
+
+async def send(factory, priority=BACKGROUND):
+    """Send through the shared delivery queue (see DeliveryQueue.submit)."""
+    return await get_queue().submit(factory, priority)
+
+
+async def stop():
+    """Stop the shared delivery queue workers."""
+    if _delivery_queue is not None:
+        logging.info(f"Delivery queue stopped: {_delivery_queue.stats()}")
+        await _delivery_queue.stop()
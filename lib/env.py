@@ -0,0 +1,18 @@
+"""Numeric settings read from the environment.
+
+An unset or empty variable gives the default; a malformed one raises
+ValueError, so a typo in the configuration fails at startup instead of
+being silently ignored.
+"""
+
+import os
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
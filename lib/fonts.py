@@ -0,0 +1,65 @@
+"""Font registry for the schedule renderers.
+
+Faces are resolved once per process (the bot, or each rendering worker) and
+then shared by every render.
+
+Stock pycairo cannot open font files: FontFace.create_from_ft_font_file only
+exists in builds with a FreeType file loader. Without one, which is the usual
+case, the Helvetica files in Assets are not used and every render gets the
+Arial toy face (as the renderers already did before the registry existed).
+The fallback is logged once per process.
+"""
+
+import logging
+import os
+
+import cairo
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Assets")
+
+FONT_FILES = {
+    'regular': os.path.join(ASSETS_DIR, "Helvetica.ttf"),
+    'bold': os.path.join(ASSETS_DIR, "Helvetica-Bold.ttf"),
+}
+
+# Toy faces used when a font file cannot be loaded, matching the old "Arial" fallback
+FALLBACK_FACES = {
+    'regular': ("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL),
+    'bold': ("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD),
+}
+
+_faces = {}
+
+
+def _load_face(style):
+    """Load one face from the Assets directory if pycairo can, or fall back to a toy face."""
+    path = FONT_FILES[style]
+    try:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        face = cairo.FontFace.create_from_ft_font_file(path)
+        logging.info(f"Loaded font {path}")
+        return face
+    except (AttributeError, OSError, cairo.Error) as e:
+        # AttributeError: this pycairo build has no FreeType file loader
+        logging.warning(f"Could not load font {path} ({e}), falling back to {FALLBACK_FACES[style][0]}")
+        return cairo.ToyFontFace(*FALLBACK_FACES[style])
+
+
+def load_fonts():
+    """Resolve every face once for this process. Safe to call repeatedly."""
+    for style in FONT_FILES:
+        if style not in _faces:
+            _faces[style] = _load_face(style)
+    return _faces
+
+
+def regular_face():
+    """Return the regular face: Helvetica if it could be loaded, else the Arial toy face."""
+    return _faces.get('regular') or load_fonts()['regular']
+
+
+def bold_face():
+    """Return the bold face: Helvetica Bold if it could be loaded, else the Arial toy face."""
+    return _faces.get('bold') or load_fonts()['bold']
@@ -0,0 +1,94 @@
+"""Versioned schema migrations for the bot's database.
+
+Each migration has a version number, a name and a function receiving a
+peewee SchemaMigrator. Applied versions are recorded in the schema_version
+table, and run_migrations() applies the pending ones in order at startup.
+
+To change the schema, append a migration to MIGRATIONS; never edit or
+renumber one that has already shipped.
+"""
+
+import logging
+from datetime import datetime
+
+from peewee import Model, IntegerField, CharField, DateTimeField, PostgresqlDatabase
+from playhouse.migrate import SchemaMigrator, migrate
+
+from lib.db import db, User
+
+
+class SchemaVersion(Model):
+    """A migration that has been applied to this database."""
+
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'schema_version'
+
+
+# Arbitrary key of the PostgreSQL advisory lock serializing bot instances
+MIGRATION_LOCK_ID = 0x45505349
+
+
+def _create_users(migrator):
+    # Baseline: a no-op on databases created before migrations existed
+    db.create_tables([User], safe=True)
+
+
+def _subscriber_indexes(migrator):
+    # Partial indexes covering the subscriber queries of the cron jobs
+    db.execute_sql("CREATE INDEX IF NOT EXISTS users_daily_idx ON users (id, username) WHERE daily = true")
+    db.execute_sql("CREATE INDEX IF NOT EXISTS users_weekly_idx ON users (id, username) WHERE weekly = true")
+
+
+def _dm_channel_id(migrator):
+    # Fresh databases already got the column from the baseline create_tables
+    if 'dm_channel_id' not in {column.name for column in db.get_columns('users')}:
+        migrate(migrator.add_column('users', 'dm_channel_id', User.dm_channel_id))
+    # The cron jobs now read the channel too: keep their scans index-only
+    for preference in ('daily', 'weekly'):
+        db.execute_sql(f"DROP INDEX IF EXISTS users_{preference}_idx")
+        db.execute_sql(
+            f"CREATE INDEX users_{preference}_idx ON users (id, username, dm_channel_id) WHERE {preference} = true"
+        )
+
+
+MIGRATIONS = [
+    (1, "create users table", _create_users),
+    (2, "subscriber partial indexes", _subscriber_indexes),
+    (3, "cached DM channel ids", _dm_channel_id),
+]
+
+
+def run_migrations():
+    """Apply every pending migration, in version order, in one transaction.
+
+    Returns:
+        List of the versions applied by this call
+    """
+    migrator = SchemaMigrator.from_database(db)
+    applied_now = []
+
+    with db.atomic():
+        if isinstance(db, PostgresqlDatabase):
+            # Another instance starting at the same time waits for us
+            db.execute_sql("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        # Created under the lock: concurrent CREATE TABLE IF NOT EXISTS can
+        # still collide on PostgreSQL (duplicate pg_type entry)
+        db.create_tables([SchemaVersion], safe=True)
+
+        applied = {version for (version,) in SchemaVersion.select(SchemaVersion.version).tuples()}
+        for version, name, apply in sorted(MIGRATIONS):
+            if version in applied:
+                continue
+            logging.info(f"Applying migration {version}: {name}")
+            apply(migrator)
+            SchemaVersion.create(version=version, name=name)
+            applied_now.append(version)
+
+    if applied_now:
+        logging.info(f"Database schema migrated to version {applied_now[-1]}")
+    return applied_now
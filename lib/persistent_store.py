@@ -0,0 +1,271 @@
+"""Local on-disk store of fetched schedules and rendered images.
+
+Kept in a SQLite file under DATA_DIR so that a restarted bot comes back with
+warm caches instead of hitting the upstream API and Cairo cold. This is a
+cache, unrelated to the users database: it can be deleted at any time.
+
+Schedules are keyed by (user, date, scope) and rendered PNGs by their render
+cache key, both with timestamps. The store is bounded by row count, age and
+image bytes, and is compacted at startup and every DATA_COMPACT_EVERY writes.
+Everything runs on worker threads through asyncio.to_thread; the disabled
+store (DATA_DIR unset) turns every call into a no-op.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from lib.env import env_int
+
+
+_connection = None
+_lock = threading.Lock()
+_writes = 0
+# Fire-and-forget writes still running, awaited on close
+_pending = set()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT,
+    PRIMARY KEY (user, date, scope)
+);
+CREATE INDEX IF NOT EXISTS schedules_fetched_at_idx ON schedules (fetched_at);
+CREATE TABLE IF NOT EXISTS renders (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_accessed_at_idx ON renders (accessed_at);
+"""
+
+
+def enabled():
+    return _connection is not None
+
+
+def _open(path):
+    global _connection
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    # auto_vacuum only applies to a new file, later compactions hand pages back
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.executescript(_SCHEMA)
+    # Stores created before validators were kept
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(schedules)")}
+    for column in ('etag', 'last_modified', 'body_hash'):
+        if column not in columns:
+            connection.execute(f"ALTER TABLE schedules ADD COLUMN {column} TEXT")
+    _connection = connection
+    _compact()
+
+
+async def open_store():
+    """Open (creating it if needed) the store in DATA_DIR, if configured.
+
+    Returns:
+        True if the store is enabled
+    """
+    data_dir = os.getenv('DATA_DIR')
+    if not data_dir or _connection is not None:
+        return _connection is not None
+    try:
+        os.makedirs(data_dir, exist_ok=True)
+        await asyncio.to_thread(_open, os.path.join(data_dir, 'cache.sqlite3'))
+    except (OSError, sqlite3.Error) as e:
+        logging.error(f"Could not open the persistent store in {data_dir}: {e}")
+        return False
+    logging.info(f"Persistent store opened in {data_dir}")
+    return True
+
+
+async def close_store():
+    """Wait for pending writes and close the store."""
+    global _connection
+    if _pending:
+        await asyncio.gather(*_pending, return_exceptions=True)
+    if _connection is not None:
+        with _lock:
+            _connection.close()
+            _connection = None
+        logging.info("Persistent store closed")
+
+
+def _execute(sql, params=()):
+    with _lock:
+        if _connection is None:
+            return []
+        return _connection.execute(sql, params).fetchall()
+
+
+def _count_write():
+    global _writes
+    _writes += 1
+    if _writes % max(1, env_int('DATA_COMPACT_EVERY', 500)) == 0:
+        _compact()
+
+
+def _compact():
+    """Drop expired and overflowing entries, then hand freed pages back to the OS.
+
+    Bounded by:
+      - DATA_MAX_AGE: seconds a schedule is kept (default 604800)
+      - DATA_MAX_SCHEDULES: schedules kept, most recent first (default 20000)
+      - DATA_MAX_RENDER_BYTES: image bytes kept, most recently used first (default 256 MiB)
+    """
+    now = time.time()
+    with _lock:
+        if _connection is None:
+            return
+        removed = _connection.execute(
+            "DELETE FROM schedules WHERE fetched_at < ?", (now - env_int('DATA_MAX_AGE', 7 * 24 * 3600),)
+        ).rowcount
+        removed += _connection.execute(
+            "DELETE FROM schedules WHERE rowid NOT IN "
+            "(SELECT rowid FROM schedules ORDER BY fetched_at DESC LIMIT ?)",
+            (env_int('DATA_MAX_SCHEDULES', 20000),),
+        ).rowcount
+        removed += _connection.execute(
+            "DELETE FROM renders WHERE key IN (SELECT key FROM ("
+            "SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS total FROM renders"
+            ") WHERE total > ?)",
+            (env_int('DATA_MAX_RENDER_BYTES', 256 * 1024 * 1024),),
+        ).rowcount
+        if removed:
+            _connection.execute("PRAGMA incremental_vacuum")
+    if removed:
+        logging.info(f"Persistent store compacted ({removed} entries removed)")
+
+
+def _spawn(func, *args):
+    """Run a write on a worker thread without making the caller wait for it."""
+    if _connection is None:
+        return
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    _pending.add(task)
+    task.add_done_callback(_finish_write)
+
+
+def _finish_write(task):
+    _pending.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"Persistent store write failed: {task.exception()}")
+
+
+def _put_schedule(key, data, validators, fetched_at):
+    user, date, scope = key
+    validators = validators or {}
+    _execute(
+        "INSERT OR REPLACE INTO schedules (user, date, scope, data, fetched_at, etag, last_modified, body_hash) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            user, date, scope, json.dumps(data, ensure_ascii=False, separators=(',', ':')), fetched_at,
+            validators.get('etag'), validators.get('last_modified'), validators.get('body_hash'),
+        ),
+    )
+    _count_write()
+
+
+def save_schedule(key, data, validators=None):
+    """Persist a fetched schedule and its HTTP validators in the background.
+
+    Args:
+        key: (user, date, scope) tuple
+        data: Normalized schedule
+        validators: Dict of 'etag', 'last_modified' and 'body_hash', if known
+    """
+    _spawn(_put_schedule, key, data, validators, time.time())
+
+
+def _load_schedules():
+    rows = _execute(
+        "SELECT user, date, scope, data, etag, last_modified, body_hash, fetched_at "
+        "FROM schedules ORDER BY fetched_at"
+    )
+    return [
+        (
+            (user, date, scope),
+            json.loads(data),
+            {'etag': etag, 'last_modified': last_modified, 'body_hash': body_hash} if body_hash else None,
+            fetched_at,
+        )
+        for user, date, scope, data, etag, last_modified, body_hash, fetched_at in rows
+    ]
+
+
+async def load_schedules():
+    """Return every persisted schedule, oldest first.
+
+    Returns:
+        List of ((user, date, scope), data, validators or None, fetched_at) tuples
+    """
+    if _connection is None:
+        return []
+    try:
+        return await asyncio.to_thread(_load_schedules)
+    except (sqlite3.Error, ValueError) as e:
+        logging.error(f"Could not load persisted schedules: {e}")
+        return []
+
+
+def _get_render(key):
+    rows = _execute("SELECT data FROM renders WHERE key = ?", (key,))
+    if not rows:
+        return None
+    _execute("UPDATE renders SET accessed_at = ? WHERE key = ?", (time.time(), key))
+    return rows[0][0]
+
+
+async def get_render(key):
+    """Return the persisted PNG bytes of a render cache key, or None."""
+    if _connection is None:
+        return None
+    try:
+        return await asyncio.to_thread(_get_render, key)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read persisted render {key}: {e}")
+        return None
+
+
+def _put_render(key, data):
+    now = time.time()
+    _execute(
+        "INSERT OR REPLACE INTO renders (key, data, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+        (key, data, len(data), now, now),
+    )
+    _count_write()
+
+
+def save_render(key, data):
+    """Persist a rendered PNG in the background."""
+    _spawn(_put_render, key, data)
+
+
+def _stats():
+    (schedules,), = _execute("SELECT COUNT(*) FROM schedules")
+    renders, render_bytes = _execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM renders")[0]
+    return {'enabled': True, 'schedules': schedules, 'renders': renders, 'render_bytes': render_bytes}
+
+
+async def stats():
+    """Return entry counts and sizes of the store."""
+    if _connection is None:
+        return {'enabled': False}
+    try:
+        return await asyncio.to_thread(_stats)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read persistent store stats: {e}")
+        return {'enabled': True}
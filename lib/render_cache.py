@@ -0,0 +1,83 @@
+"""Content-addressed cache of rendered schedule PNGs.
+
+Images are keyed by a hash of the normalized schedule plus the renderer
+variant, so students of the same class group share one render, and an
+unchanged week is served without any Cairo work. Entries live in an
+in-memory LRU bounded by bytes, backed by the persistent store when it is
+enabled (DATA_DIR), so renders survive restarts.
+"""
+
+import hashlib
+import json
+
+from lib import persistent_store
+from lib.cache import ByteLRUCache
+from lib.env import env_int
+
+
+# Bump whenever the rendered output changes, so stale disk entries are ignored
+RENDER_VERSION = 2
+
+# Course fields that influence the rendered image
+_RENDERED_FIELDS = ('date', 'start_time', 'end_time', 'name', 'room', 'teacher')
+
+_memory = None
+_disk_hits = 0
+
+
+def _get_memory():
+    """Build the memory tier lazily, sized by RENDER_CACHE_MAX_BYTES (default 64 MiB)."""
+    global _memory
+    if _memory is None:
+        _memory = ByteLRUCache(max_bytes=env_int('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    return _memory
+
+
+def normalize_schedule(schedule):
+    """Reduce a schedule to the fields that are drawn, in a stable order."""
+    courses = [
+        tuple(str(course.get(field) or '') for field in _RENDERED_FIELDS)
+        for course in schedule
+    ]
+    courses.sort()
+    return courses
+
+
+def schedule_hash(schedule):
+    """Return a stable hex digest of the normalized schedule content."""
+    payload = json.dumps(normalize_schedule(schedule), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render_key(schedule, variant):
+    """Return the cache key of schedule rendered with the given variant."""
+    return f"v{RENDER_VERSION}-{variant}-{schedule_hash(schedule)}"
+
+
+async def get(key):
+    """Return the cached PNG bytes for key from memory or the persistent store, or None."""
+    global _disk_hits
+    memory = _get_memory()
+    data = memory.get(key)
+    if data is not None:
+        return data
+
+    data = await persistent_store.get_render(key)
+    if data is not None:
+        _disk_hits += 1
+        memory.set(key, data)
+    return data
+
+
+async def put(key, data):
+    """Store PNG bytes under key in memory and, if enabled, in the persistent store."""
+    _get_memory().set(key, data)
+    persistent_store.save_render(key, data)
+
+
+def stats():
+    """Return hit rate and bytes held by the render cache."""
+    result = _get_memory().stats()
+    result['disk_hits'] = _disk_hits
+    result['disk_enabled'] = persistent_store.enabled()
+    return result
@@ -0,0 +1,155 @@
+"""Async rendering service for schedule images.
+
+The Cairo renderers in lib.schedule_utils are synchronous and CPU-bound. This
+module runs them in a worker pool so the discord.py event loop (and its
+gateway heartbeat) keeps running while images are drawn, and so several
+images can be rendered in parallel across cores.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lib import fonts, render_cache
+from lib.cache import SingleFlight
+from lib.env import env_int
+from lib.schedule_utils import day_schedule_image, week_schedule_image
+
+
+_executor = None
+_workers = 0
+# Identical renders in flight, drawn once for every caller
+_inflight = SingleFlight()
+
+# Tiny schedule rendered by each worker at startup, so Cairo, the fonts and
+# the PNG encoder are loaded before the first real request
+_WARM_UP_SCHEDULE = [{
+    'date': '2024-01-01',
+    'name': 'Warm-up',
+    'start_time': '09:00',
+    'end_time': '10:00',
+    'room': '',
+    'teacher': '',
+}]
+
+
+def _warm_up_worker():
+    """Pool initializer: load the fonts and render one throwaway image in the new worker."""
+    fonts.load_fonts()
+    day_schedule_image(_WARM_UP_SCHEDULE)
+
+
+def _noop():
+    return os.getpid()
+
+
+def start_renderer():
+    """Create the rendering pool.
+
+    Configured from the environment:
+      - RENDER_WORKERS: number of workers (default: number of CPUs)
+      - RENDER_EXECUTOR: "process" (default) or "thread"
+    """
+    global _executor, _workers
+    if _executor is not None:
+        return
+
+    _workers = max(1, env_int('RENDER_WORKERS', os.cpu_count() or 1))
+    kind = os.getenv('RENDER_EXECUTOR', 'process')
+
+    if kind == 'thread':
+        _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='render')
+    else:
+        # Workers come from a clean forkserver instead of a fork of the bot
+        # process, so they don't inherit its event loop, sockets and threads.
+        # index.py only starts the bot under __main__, so workers can import it.
+        _executor = ProcessPoolExecutor(
+            max_workers=_workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_warm_up_worker,
+        )
+    logging.info(f"Rendering pool started ({kind}, {_workers} worker(s))")
+
+
+async def warm_up():
+    """Start every worker now instead of on the first render."""
+    if _executor is None:
+        start_renderer()
+    if isinstance(_executor, ThreadPoolExecutor):
+        await _run(_warm_up_worker)
+        return
+
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*(loop.run_in_executor(_executor, _noop) for _ in range(_workers)))
+    logging.info(f"Rendering pool warmed up ({len(set(pids))} process(es))")
+
+
+def shutdown_renderer():
+    """Stop the rendering pool, cancelling renders that have not started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logging.info("Rendering pool stopped")
+
+
+async def _run(func, *args):
+    if _executor is None:
+        start_renderer()
+    loop = asyncio.get_running_loop()
+    executor = _executor
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer): replace the pool once.
+        # Concurrent callers all see the same breakage, only the first one
+        # restarts it, the others retry on the new pool.
+        if _executor is executor:
+            logging.error("Rendering pool is broken, restarting it")
+            shutdown_renderer()
+            start_renderer()
+        return await loop.run_in_executor(_executor, func, *args)
+
+
+async def _render_cached(func, variant, schedule):
+    """Serve a render from the render cache, or render it in the pool and cache it.
+
+    Concurrent misses on the same key share a single render.
+    """
+    if not schedule:
+        return func(schedule)
+
+    key = render_cache.render_key(schedule, variant)
+    cached = await render_cache.get(key)
+    if cached is not None:
+        return True, cached
+
+    return await _inflight.do(key, lambda: _render_and_store(func, key, schedule))
+
+
+async def _render_and_store(func, key, schedule):
+    success, result = await _run(func, schedule)
+    if success:
+        await render_cache.put(key, result)
+    return success, result
+
+
+async def render_day_image(schedule):
+    """Render a daily schedule image in the pool, reusing identical renders.
+
+    Returns:
+        The (success, bytes_or_error) tuple of day_schedule_image
+    """
+    return await _render_cached(day_schedule_image, "day-800x900", schedule)
+
+
+async def render_week_image(schedule):
+    """Render a weekly schedule image in the pool, reusing identical renders.
+
+    Returns:
+        The (success, bytes_or_error) tuple of week_schedule_image
+    """
+    return await _render_cached(week_schedule_image, "week-1600x900", schedule)
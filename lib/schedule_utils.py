@@ -1,5 +1,7 @@
-import discord, random, cairo, os, colorsys, io
+import discord, random, cairo, colorsys, io, functools, threading
+from dataclasses import dataclass
 from datetime import datetime
+from lib import fonts
 
 
 FRENCH_DAYS = {
@@ -27,6 +29,9 @@ FRENCH_MONTHS = {
     'December': 'Décembre'
 }
 
+# Shown above a reply built from the last good schedule, when the API did not answer in time
+STALE_MARKER = "*Données en cache : le service d'emploi du temps ne répond pas, cet emploi du temps peut ne pas être à jour.*"
+
 
 def create_schedule_embed(schedule):
     embed = discord.Embed(
@@ -70,14 +75,15 @@ def create_schedule_embed(schedule):
 
 def random_pastel_color(name=None):
     """Generate a random pastel color based on a name for consistency"""
+    # Use a private generator so concurrent renders never share the global seed
     if name:
         seed_value = sum(ord(c) for c in str(name))
-        random.seed(seed_value)
+        rng = random.Random(seed_value)
     else:
-        random.seed(datetime.now().timestamp())
+        rng = random.Random(datetime.now().timestamp())
     
     # Generate random hue (0-1), fixed saturation and luminance
-    hue = random.random()
+    hue = rng.random()
     saturation = 0.50
     luminance = 0.75
     
@@ -89,8 +95,6 @@ def random_pastel_color(name=None):
     g = int(g * 255)
     b = int(b * 255)
     
-    random.seed()
-    
     return (r, g, b)
 
 
@@ -127,495 +131,435 @@ def draw_rounded_rectangle(ctx, x, y, width, height, radius):
     
     ctx.close_path()
 
-def day_schedule_image(schedule):
-    """Generate a daily schedule image using Cairo with time-based grid"""
-    if not schedule:
-        return False, "No schedule data provided"
-    
-    # Image dimensions - narrower for single day
-    WIDTH = 800
-    HEIGHT = 900
-    MARGIN = 60
-    HEADER_HEIGHT = 80
-    TIME_COLUMN_WIDTH = 80
-    
-    # Time configuration (9h to 18h)
-    START_HOUR = 9
-    END_HOUR = 18
-    TOTAL_HOURS = END_HOUR - START_HOUR
-    
-    # Create Cairo surface and context
-    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
-    ctx = cairo.Context(surface)
-    
-    # Load custom fonts
-    try:
-        helvetica_path = os.path.join("Assets", "Helvetica.ttf")
-        helvetica_bold_path = os.path.join("Assets", "Helvetica-Bold.ttf")
-        
-        # Create font face from file
-        helvetica_face = cairo.FontFace.create_from_ft_font_file(helvetica_path)
-        helvetica_bold_face = cairo.FontFace.create_from_ft_font_file(helvetica_bold_path)
-    except:
-        helvetica_face = None
-        helvetica_bold_face = None
-    
-    # Background
-    ctx.set_source_rgb(1, 1, 1)  # White background
-    ctx.paint()
-    
-    # Get the first date from schedule (assuming all items are from the same day)
-    first_item = schedule[0]
-    date = first_item['date']
-    
-    # Calculate grid dimensions - single day takes full width
-    day_width = WIDTH - TIME_COLUMN_WIDTH - 2 * MARGIN
-    
-    # Calculate time grid dimensions
-    grid_start_y = HEADER_HEIGHT + 80
-    available_height = HEIGHT - grid_start_y - MARGIN
-    hour_height = available_height / TOTAL_HOURS
-    
-    # Draw title
-    if helvetica_bold_face:
-        ctx.set_font_face(helvetica_bold_face)
-    else:
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-    ctx.set_font_size(28)
-    ctx.set_source_rgb(0.2, 0.2, 0.2)
-    
-    title = "Emploi du temps EPSI"
-    text_extents = ctx.text_extents(title)
-    title_x = (WIDTH - text_extents.width) / 2
-    ctx.move_to(title_x, 40)
-    ctx.show_text(title)
-    
-    # Draw time column
-    if helvetica_bold_face:
-        ctx.set_font_face(helvetica_bold_face)
-    else:
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-    ctx.set_font_size(14)
-    ctx.set_source_rgb(0.1, 0.1, 0.1)  # Much darker for better readability
-    
-    for hour in range(START_HOUR, END_HOUR + 1):
-        y = grid_start_y + (hour - START_HOUR) * hour_height
-        time_text = f"{hour:02d}:00"
-        text_extents = ctx.text_extents(time_text)
-        ctx.move_to(MARGIN + TIME_COLUMN_WIDTH - text_extents.width - 15, y + 6)
-        ctx.show_text(time_text)
-        
-        # Draw horizontal grid line
-        ctx.set_source_rgb(0.9, 0.9, 0.9)
-        ctx.set_line_width(1)
-        ctx.move_to(MARGIN + TIME_COLUMN_WIDTH, y)
-        ctx.line_to(WIDTH - MARGIN, y)
-        ctx.stroke()
-        
-        ctx.set_source_rgb(0.1, 0.1, 0.1)
-    
-    # Draw day header
-    x = MARGIN + TIME_COLUMN_WIDTH
-    
-    # Parse date
+# Layout shared by every schedule image
+MARGIN = 60
+HEADER_HEIGHT = 80
+TIME_COLUMN_WIDTH = 80
+GRID_START_Y = HEADER_HEIGHT + 80
+START_HOUR = 9
+END_HOUR = 18
+
+# Minimum course block heights for the optional text lines
+SHOW_TIME_HEIGHT = 30
+SHOW_ROOM_HEIGHT = 50
+SHOW_TEACHER_HEIGHT = 70
+
+
+@dataclass(frozen=True)
+class TextTier:
+    """Font sizes and line spacing used for course blocks above min_height."""
+
+    min_height: float
+    line_spacing: int
+    name_size: int
+    time_size: int
+    room_size: int
+    teacher_size: int
+
+
+@dataclass(frozen=True)
+class ScheduleLayout:
+    """Configuration of the render engine for one kind of image.
+
+    Attributes:
+        width, height: Image size in pixels
+        by_date: One column per date (week view) instead of a single column
+            titled with the first course's date (day view)
+        header_size, header_line_height: Day header font size and line step
+        text_padding: Horizontal offset of course text inside its block
+        text_top: Offset of the first text baseline from the block top
+        text_tiers: TextTier list from the tallest blocks to the smallest, the
+            last one applying to every remaining block
+    """
+
+    width: int
+    height: int
+    by_date: bool
+    header_size: int
+    header_line_height: int
+    text_padding: int
+    text_top: int
+    text_tiers: tuple
+
+    def text_tier(self, block_height):
+        for tier in self.text_tiers:
+            if block_height > tier.min_height:
+                return tier
+        return self.text_tiers[-1]
+
+
+DAY_LAYOUT = ScheduleLayout(
+    width=800,
+    height=900,
+    by_date=False,
+    header_size=20,
+    header_line_height=22,
+    text_padding=15,
+    text_top=30,
+    text_tiers=(
+        TextTier(80, 18, 18, 16, 16, 14),
+        TextTier(40, 14, 14, 12, 12, 10),
+        TextTier(float('-inf'), 12, 12, 10, 10, 8),
+    ),
+)
+
+WEEK_LAYOUT = ScheduleLayout(
+    width=1600,
+    height=900,
+    by_date=True,
+    header_size=18,
+    header_line_height=20,
+    text_padding=11,
+    text_top=25,
+    text_tiers=(
+        TextTier(80, 14, 16, 12, 12, 12),
+        TextTier(40, 12, 16, 12, 12, 12),
+        TextTier(float('-inf'), 10, 16, 12, 12, 12),
+    ),
+)
+
+
+@dataclass(slots=True)
+class Column:
+    """A day column of the grid and its header lines."""
+
+    x: float
+    width: float
+    header_lines: tuple
+
+
+@dataclass(slots=True)
+class CourseBlock:
+    """A course positioned on the grid, with its text already prepared."""
+
+    x: float
+    y: float
+    width: float
+    height: float
+    background: tuple
+    foreground: tuple
+    tier: TextTier
+    name: str
+    time_text: str
+    room_text: str
+    teacher_text: str
+
+
+def _parse_hour(value):
+    """Convert "HH:MM" into fractional hours."""
+    hours, _, minutes = value.partition(':')
+    return float(hours) + float(minutes) / 60
+
+
+@functools.lru_cache(maxsize=1024)
+def _course_colors(name):
+    """Return the (background, text) colors of a course as 0-1 RGB tuples."""
+    color = random_pastel_color(name)
+    background = tuple(c / 255 for c in color)
+    foreground = tuple(c / 255 for c in text_color_for_bg(color))
+    return background, foreground
+
+
+ELLIPSIS = "..."
+
+
+_measure = threading.local()
+
+
+def _measure_context():
+    """Scratch Cairo context of this thread, used only to measure text."""
+    ctx = getattr(_measure, 'ctx', None)
+    if ctx is None:
+        ctx = _measure.ctx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+    return ctx
+
+
+def _text_width(ctx, text):
+    return ctx.text_extents(text).x_advance
+
+
+@functools.lru_cache(maxsize=4096)
+def ellipsize(text, bold, size, max_width):
+    """Cut text so that it fits in max_width pixels, ending it with "..." if cut.
+
+    The cut point is found by binary search over real glyph extents, and the
+    result is memoized, so recurring course names cost a dict lookup.
+
+    Args:
+        text: Text to fit
+        bold: Whether the bold face is used (regular otherwise)
+        size: Font size
+        max_width: Available width in pixels
+    """
+    ctx = _measure_context()
+    ctx.set_font_face(fonts.bold_face() if bold else fonts.regular_face())
+    ctx.set_font_size(size)
+
+    if _text_width(ctx, text) <= max_width:
+        return text
+
+    # Longest prefix whose ellipsized form still fits
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _text_width(ctx, text[:middle].rstrip() + ELLIPSIS) <= max_width:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + ELLIPSIS
+
+
+def _header_lines(date):
     try:
         date_obj = datetime.strptime(date, "%Y-%m-%d")
         day_name = FRENCH_DAYS[date_obj.strftime('%A')]
-        date_str = f"{day_name}\n{date_obj.day:02d}/{date_obj.month:02d}"
+        return (day_name, f"{date_obj.day:02d}/{date_obj.month:02d}")
     except (ValueError, KeyError):
-        day_name = date
-        date_str = date
-    
-    # Draw day header background
-    ctx.set_source_rgb(0.2, 0.4, 0.7)
-    ctx.rectangle(x, HEADER_HEIGHT, day_width, 60)
-    ctx.fill()
-    
-    # Draw day header text
-    if helvetica_bold_face:
-        ctx.set_font_face(helvetica_bold_face)
+        return (date,)
+
+
+def layout_schedule(schedule, layout):
+    """Parse a schedule once into grid columns and positioned course blocks.
+
+    Args:
+        schedule: List of course dicts as returned by the API
+        layout: ScheduleLayout describing the image
+
+    Returns:
+        (columns, blocks) lists of Column and CourseBlock
+    """
+    if layout.by_date:
+        courses_by_date = {}
+        for course in schedule:
+            courses_by_date.setdefault(course['date'], []).append(course)
+        groups = [(date, courses_by_date[date]) for date in sorted(courses_by_date)]
     else:
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-    ctx.set_font_size(20)
-    ctx.set_source_rgb(1, 1, 1)
-    
-    lines = date_str.split('\n')
-    for j, line in enumerate(lines):
-        text_extents = ctx.text_extents(line)
-        text_x = x + (day_width - text_extents.width) / 2
-        text_y = HEADER_HEIGHT + 25 + j * 22
-        ctx.move_to(text_x, text_y)
-        ctx.show_text(line)
-    
-    # Draw courses for this day based on time
-    for course in schedule:
-        try:
-            # Parse start and end times
-            start_time = course.get('start_time', '09:00')
-            end_time = course.get('end_time', '10:00')
-            
-            start_hour = float(start_time.split(':')[0]) + float(start_time.split(':')[1]) / 60
-            end_hour = float(end_time.split(':')[0]) + float(end_time.split(':')[1]) / 60
-            
-            # Calculate position and size
-            course_start_y = grid_start_y + (start_hour - START_HOUR) * hour_height
-            course_height = (end_hour - start_hour) * hour_height
-            
+        # Single column titled with the first course's date
+        groups = [(schedule[0]['date'], schedule)]
+
+    column_width = (layout.width - TIME_COLUMN_WIDTH - 2 * MARGIN) / len(groups)
+    hour_height = (layout.height - GRID_START_Y - MARGIN) / (END_HOUR - START_HOUR)
+    # Text starts text_padding into the block and keeps the same margin on the right
+    max_width = column_width - 2 * layout.text_padding
+
+    columns = []
+    blocks = []
+    for i, (date, courses) in enumerate(groups):
+        x = MARGIN + TIME_COLUMN_WIDTH + i * column_width
+        columns.append(Column(x, column_width, _header_lines(date)))
+
+        for course in courses:
+            try:
+                start_time = course.get('start_time', '09:00')
+                end_time = course.get('end_time', '10:00')
+                start_hour = _parse_hour(start_time)
+                end_hour = _parse_hour(end_time)
+            except (ValueError, AttributeError):
+                # Skip courses with invalid time format
+                continue
+
             # Skip if course is outside our time range
             if start_hour < START_HOUR or end_hour > END_HOUR:
                 continue
-            
-            # Generate a color for this course
-            color = random_pastel_color(course.get('name'))
-            bg_r, bg_g, bg_b = [c/255 for c in color]
-            
-            # Draw course background with rounded corners
-            ctx.set_source_rgb(bg_r, bg_g, bg_b)
-            draw_rounded_rectangle(ctx, x + 2, course_start_y, day_width - 4, course_height - 2, 16)
-            ctx.fill()
-            
-            # Determine text color based on background
-            text_color = text_color_for_bg(color)
-            text_r, text_g, text_b = [c/255 for c in text_color]
-            ctx.set_source_rgb(text_r, text_g, text_b)
-            
-            # Draw course text
-            if helvetica_bold_face:
-                ctx.set_font_face(helvetica_bold_face)
-            else:
-                ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-            
-            # Adjust font size and spacing based on course height
-            if course_height > 80:
-                line_spacing = 18
-                font_size = 18
-            elif course_height > 40:
-                line_spacing = 14
-                font_size = 14
+
+            height = (end_hour - start_hour) * hour_height
+            name = course.get('name')
+            if name:
+                background, foreground = _course_colors(name)
             else:
-                line_spacing = 12
-                font_size = 12
-            
-            text_x = x + 15
-            current_y = course_start_y + 30
-            
-            # Course name (can be longer since we have more width)
-            name = course.get('name', 'Cours')
-            max_chars = int((day_width - 30) / 10)  # More space for text
-            if len(name) > max_chars:
-                name = name[:max_chars-3] + "..."
-            
-            ctx.set_font_size(font_size)
-            ctx.move_to(text_x, current_y)
-            ctx.show_text(name)
-            current_y += line_spacing
-            
-            # Time (only if there's space)
-            if course_height > 30:
-                if helvetica_face:
-                    ctx.set_font_face(helvetica_face)
-                else:
-                    ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                ctx.set_font_size(font_size - 2)
-                time_str = f"{start_time} - {end_time}"
-                ctx.move_to(text_x, current_y)
-                ctx.show_text(time_str)
-                current_y += line_spacing
-            
-            # Room (only if there's space)
-            if course_height > 50:
-                room = course.get('room', '')
-                if room:
-                    if helvetica_face:
-                        ctx.set_font_face(helvetica_face)
-                    else:
-                        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                    room_text = f"Salle: {room}"
-                    if len(room_text) > max_chars:
-                        room_text = room_text[:max_chars-3] + "..."
-                    ctx.move_to(text_x, current_y)
-                    ctx.show_text(room_text)
-                    current_y += line_spacing
-            
-            # Teacher (only if there's space)
-            if course_height > 70:
-                teacher = course.get('teacher', '')
-                if teacher:
-                    if helvetica_face:
-                        ctx.set_font_face(helvetica_face)
-                    else:
-                        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                    teacher_text = teacher
-                    if len(teacher_text) > max_chars:
-                        teacher_text = teacher_text[:max_chars-3] + "..."
-                    ctx.set_font_size(font_size - 4)
-                    ctx.move_to(text_x, current_y)
-                    ctx.show_text(teacher_text)
-            
-        except (ValueError, IndexError) as e:
-            # Skip courses with invalid time format
-            continue
-    
-    # Convert surface to bytes
-    try:
-        png_buffer = io.BytesIO()
-        surface.write_to_png(png_buffer)
-        png_buffer.seek(0)
-        image_bytes = png_buffer.getvalue()
-        return True, image_bytes
-    except Exception as e:
-        return False, f"Error generating PNG: {str(e)}"
-    finally:
-        surface.finish()
+                # Unnamed courses get a fresh random color, so don't cache it
+                background, foreground = _course_colors.__wrapped__(name)
+            room = course.get('room', '')
+            tier = layout.text_tier(height)
+            blocks.append(CourseBlock(
+                x=x,
+                y=GRID_START_Y + (start_hour - START_HOUR) * hour_height,
+                width=column_width,
+                height=height,
+                background=background,
+                foreground=foreground,
+                tier=tier,
+                name=ellipsize(name or 'Cours', True, tier.name_size, max_width),
+                time_text=f"{start_time} - {end_time}",
+                room_text=ellipsize(f"Salle: {room}", False, tier.room_size, max_width) if room else '',
+                teacher_text=ellipsize(course.get('teacher', '') or '', False, tier.teacher_size, max_width),
+            ))
 
-def week_schedule_image(schedule):
-    """Generate a weekly schedule image using Cairo with time-based grid"""
-    if not schedule:
-        return False, "No schedule data provided"
-    
-    # Image dimensions
-    WIDTH = 1600
-    HEIGHT = 900
-    MARGIN = 60
-    HEADER_HEIGHT = 80
-    TIME_COLUMN_WIDTH = 80
-    
-    # Time configuration (9h to 18h)
-    START_HOUR = 9
-    END_HOUR = 18
-    TOTAL_HOURS = END_HOUR - START_HOUR
-    
-    # Create Cairo surface and context
-    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+    return columns, blocks
+
+
+# Per-thread cache of static layers: Cairo objects must not be used from
+# several threads at once, and with RENDER_EXECUTOR=thread renders run in
+# parallel threads of the same process
+_static_layers = threading.local()
+
+
+def _static_layer(width, height, columns):
+    """Return this thread's static layer for a (size, column count), drawing it once."""
+    layers = getattr(_static_layers, 'surfaces', None)
+    if layers is None:
+        layers = _static_layers.surfaces = {}
+    key = (width, height, columns)
+    surface = layers.get(key)
+    if surface is None:
+        if len(layers) >= 16:
+            layers.clear()
+        surface = layers[key] = _draw_static_layer(width, height, columns)
+    return surface
+
+
+def _draw_static_layer(width, height, columns):
+    """Render the parts of an image that never depend on the schedule.
+
+    The white background, title, hour labels, horizontal grid lines and the
+    day header bars are drawn once per (size, column count) and thread, then
+    painted as the base of every new image.
+    """
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
     ctx = cairo.Context(surface)
-    
-    # Load custom fonts
-    try:
-        helvetica_path = os.path.join("Assets", "Helvetica.ttf")
-        helvetica_bold_path = os.path.join("Assets", "Helvetica-Bold.ttf")
-        
-        # Create font face from file
-        helvetica_face = cairo.FontFace.create_from_ft_font_file(helvetica_path)
-        helvetica_bold_face = cairo.FontFace.create_from_ft_font_file(helvetica_bold_path)
-    except:
-        helvetica_face = None
-        helvetica_bold_face = None
-    
+    helvetica_bold_face = fonts.bold_face()
+
+    day_width = (width - TIME_COLUMN_WIDTH - 2 * MARGIN) / columns
+    hour_height = (height - GRID_START_Y - MARGIN) / (END_HOUR - START_HOUR)
+
     # Background
     ctx.set_source_rgb(1, 1, 1)  # White background
     ctx.paint()
-    
-    # Organize schedule by date
-    schedule_by_date = {}
-    for item in schedule:
-        date = item['date']
-        if date not in schedule_by_date:
-            schedule_by_date[date] = []
-        schedule_by_date[date].append(item)
-    
-    # Sort dates
-    sorted_dates = sorted(schedule_by_date.keys())
-    
-    if not sorted_dates:
-        return False, "No valid dates in schedule"
-    
-    # Calculate grid dimensions
-    days_count = len(sorted_dates)
-    available_width = WIDTH - TIME_COLUMN_WIDTH - 2 * MARGIN
-    day_width = available_width / days_count
-    
-    # Calculate time grid dimensions
-    grid_start_y = HEADER_HEIGHT + 80
-    available_height = HEIGHT - grid_start_y - MARGIN
-    hour_height = available_height / TOTAL_HOURS
-    
+
     # Draw title
-    if helvetica_bold_face:
-        ctx.set_font_face(helvetica_bold_face)
-    else:
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
+    ctx.set_font_face(helvetica_bold_face)
     ctx.set_font_size(28)
     ctx.set_source_rgb(0.2, 0.2, 0.2)
-    
+
     title = "Emploi du temps EPSI"
     text_extents = ctx.text_extents(title)
-    title_x = (WIDTH - text_extents.width) / 2
+    title_x = (width - text_extents.width) / 2
     ctx.move_to(title_x, 40)
     ctx.show_text(title)
-    
+
     # Draw time column
-    if helvetica_bold_face:
-        ctx.set_font_face(helvetica_bold_face)
-    else:
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
     ctx.set_font_size(14)
     ctx.set_source_rgb(0.1, 0.1, 0.1)  # Much darker for better readability
-    
+
     for hour in range(START_HOUR, END_HOUR + 1):
-        y = grid_start_y + (hour - START_HOUR) * hour_height
+        y = GRID_START_Y + (hour - START_HOUR) * hour_height
         time_text = f"{hour:02d}:00"
         text_extents = ctx.text_extents(time_text)
         ctx.move_to(MARGIN + TIME_COLUMN_WIDTH - text_extents.width - 15, y + 6)
         ctx.show_text(time_text)
-        
+
         # Draw horizontal grid line
         ctx.set_source_rgb(0.9, 0.9, 0.9)
         ctx.set_line_width(1)
         ctx.move_to(MARGIN + TIME_COLUMN_WIDTH, y)
-        ctx.line_to(WIDTH - MARGIN, y)
+        ctx.line_to(width - MARGIN, y)
         ctx.stroke()
-        
+
         ctx.set_source_rgb(0.1, 0.1, 0.1)
-    
-    # Draw day headers and vertical grid lines
-    for i, date in enumerate(sorted_dates):
-        x = MARGIN + TIME_COLUMN_WIDTH + i * day_width
-        
-        # Parse date
-        try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            day_name = FRENCH_DAYS[date_obj.strftime('%A')]
-            date_str = f"{day_name}\n{date_obj.day:02d}/{date_obj.month:02d}"
-        except (ValueError, KeyError):
-            day_name = date
-            date_str = date
-        
-        # Draw day header background
-        ctx.set_source_rgb(0.2, 0.4, 0.7)
-        ctx.rectangle(x, HEADER_HEIGHT, day_width, 60)
+
+    # Draw day header backgrounds
+    ctx.set_source_rgb(0.2, 0.4, 0.7)
+    for i in range(columns):
+        ctx.rectangle(MARGIN + TIME_COLUMN_WIDTH + i * day_width, HEADER_HEIGHT, day_width, 60)
         ctx.fill()
-        
-        # Draw day header text
-        if helvetica_bold_face:
-            ctx.set_font_face(helvetica_bold_face)
-        else:
-            ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-        ctx.set_font_size(18)
+
+    surface.flush()
+    return surface
+
+
+def draw_schedule(columns, blocks, layout):
+    """Draw laid out columns and course blocks and encode the image as PNG.
+
+    Returns:
+        PNG bytes
+    """
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, layout.width, layout.height)
+    try:
+        ctx = cairo.Context(surface)
+        helvetica_face = fonts.regular_face()
+        helvetica_bold_face = fonts.bold_face()
+
+        # Static background, title, hour labels, grid and header bars
+        ctx.set_source_surface(_static_layer(layout.width, layout.height, len(columns)), 0, 0)
+        ctx.paint()
+
+        # Day header text
+        ctx.set_font_face(helvetica_bold_face)
+        ctx.set_font_size(layout.header_size)
         ctx.set_source_rgb(1, 1, 1)
-        
-        lines = date_str.split('\n')
-        for j, line in enumerate(lines):
-            text_extents = ctx.text_extents(line)
-            text_x = x + (day_width - text_extents.width) / 2
-            text_y = HEADER_HEIGHT + 25 + j * 20
-            ctx.move_to(text_x, text_y)
-            ctx.show_text(line)
-        
-        # Draw courses for this day based on time
-        courses = schedule_by_date[date]
-        
-        for course in courses:
-            try:
-                # Parse start and end times
-                start_time = course.get('start_time', '09:00')
-                end_time = course.get('end_time', '10:00')
-                
-                start_hour = float(start_time.split(':')[0]) + float(start_time.split(':')[1]) / 60
-                end_hour = float(end_time.split(':')[0]) + float(end_time.split(':')[1]) / 60
-                
-                # Calculate position and size
-                course_start_y = grid_start_y + (start_hour - START_HOUR) * hour_height
-                course_height = (end_hour - start_hour) * hour_height
-                
-                # Skip if course is outside our time range
-                if start_hour < START_HOUR or end_hour > END_HOUR:
-                    continue
-                
-                # Generate a color for this course
-                color = random_pastel_color(course.get('name'))
-                bg_r, bg_g, bg_b = [c/255 for c in color]
-                
-                # Draw course background with rounded corners
-                ctx.set_source_rgb(bg_r, bg_g, bg_b)
-                draw_rounded_rectangle(ctx, x + 2, course_start_y, day_width - 4, course_height - 2, 16)
-                ctx.fill()
-                
-                # Determine text color based on background
-                text_color = text_color_for_bg(color)
-                text_r, text_g, text_b = [c/255 for c in text_color]
-                ctx.set_source_rgb(text_r, text_g, text_b)
-                
-                # Draw course text
-                if helvetica_bold_face:
-                    ctx.set_font_face(helvetica_bold_face)
-                else:
-                    ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-                
-                # Adjust font size based on course height
-                if course_height > 80:
-                    line_spacing = 14
-                elif course_height > 40:
-                    line_spacing = 12
-                else:
-                    line_spacing = 10
-                
-                text_x = x + 11
-                current_y = course_start_y + 25
-                
-                # Course name (truncated if too long)
-                name = course.get('name', 'Cours')
-                max_chars = int((day_width - 24) / 7)
-                if len(name) > max_chars:
-                    name = name[:max_chars-3] + "..."
-                
-                ctx.set_font_size(16)
+        for column in columns:
+            for j, line in enumerate(column.header_lines):
+                text_extents = ctx.text_extents(line)
+                ctx.move_to(column.x + (column.width - text_extents.width) / 2,
+                            HEADER_HEIGHT + 25 + j * layout.header_line_height)
+                ctx.show_text(line)
+
+        for block in blocks:
+            tier = block.tier
+
+            # Course background with rounded corners
+            ctx.set_source_rgb(*block.background)
+            draw_rounded_rectangle(ctx, block.x + 2, block.y, block.width - 4, block.height - 2, 16)
+            ctx.fill()
+
+            ctx.set_source_rgb(*block.foreground)
+            text_x = block.x + layout.text_padding
+            current_y = block.y + layout.text_top
+
+            ctx.set_font_face(helvetica_bold_face)
+            ctx.set_font_size(tier.name_size)
+            ctx.move_to(text_x, current_y)
+            ctx.show_text(block.name)
+            current_y += tier.line_spacing
+
+            # Optional lines, only if there's space
+            ctx.set_font_face(helvetica_face)
+            if block.height > SHOW_TIME_HEIGHT:
+                ctx.set_font_size(tier.time_size)
                 ctx.move_to(text_x, current_y)
-                ctx.show_text(name)
-                current_y += line_spacing
-                
-                # Time (only if there's space)
-                if course_height > 30:
-                    if helvetica_face:
-                        ctx.set_font_face(helvetica_face)
-                    else:
-                        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                    ctx.set_font_size(12)
-                    time_str = f"{start_time} - {end_time}"
-                    ctx.move_to(text_x, current_y)
-                    ctx.show_text(time_str)
-                    current_y += line_spacing
-                
-                # Room (only if there's space)
-                if course_height > 50:
-                    room = course.get('room', '')
-                    if room:
-                        if helvetica_face:
-                            ctx.set_font_face(helvetica_face)
-                        else:
-                            ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                        room_text = f"Salle: {room}"
-                        if len(room_text) > max_chars:
-                            room_text = room_text[:max_chars-3] + "..."
-                        ctx.move_to(text_x, current_y)
-                        ctx.show_text(room_text)
-                        current_y += line_spacing
-                
-                # Teacher (only if there's space)
-                if course_height > 70:
-                    teacher = course.get('teacher', '')
-                    if teacher:
-                        if helvetica_face:
-                            ctx.set_font_face(helvetica_face)
-                        else:
-                            ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                        teacher_text = teacher
-                        if len(teacher_text) > max_chars:
-                            teacher_text = teacher_text[:max_chars-3] + "..."
-                        ctx.move_to(text_x, current_y)
-                        ctx.show_text(teacher_text)
-                
-            except (ValueError, IndexError) as e:
-                # Skip courses with invalid time format
-                continue
-    
-    # Convert surface to bytes
-    try:
+                ctx.show_text(block.time_text)
+                current_y += tier.line_spacing
+
+            if block.height > SHOW_ROOM_HEIGHT and block.room_text:
+                ctx.set_font_size(tier.room_size)
+                ctx.move_to(text_x, current_y)
+                ctx.show_text(block.room_text)
+                current_y += tier.line_spacing
+
+            if block.height > SHOW_TEACHER_HEIGHT and block.teacher_text:
+                ctx.set_font_size(tier.teacher_size)
+                ctx.move_to(text_x, current_y)
+                ctx.show_text(block.teacher_text)
+
         png_buffer = io.BytesIO()
         surface.write_to_png(png_buffer)
-        png_buffer.seek(0)
-        image_bytes = png_buffer.getvalue()
-        return True, image_bytes
+        return png_buffer.getvalue()
+    finally:
+        surface.finish()
+
+
+def render_schedule_image(schedule, layout):
+    """Render a schedule with the given layout.
+
+    Returns:
+        (True, PNG bytes) on success, (False, error message) otherwise
+    """
+    if not schedule:
+        return False, "No schedule data provided"
+
+    columns, blocks = layout_schedule(schedule, layout)
+
+    try:
+        return True, draw_schedule(columns, blocks, layout)
     except Exception as e:
         return False, f"Error generating PNG: {str(e)}"
-    finally:
-        surface.finish()
\ No newline at end of file
+
+
+def day_schedule_image(schedule):
+    """Generate a daily schedule image using Cairo with time-based grid"""
+    return render_schedule_image(schedule, DAY_LAYOUT)
+
+
+def week_schedule_image(schedule):
+    """Generate a weekly schedule image using Cairo with time-based grid"""
+    return render_schedule_image(schedule, WEEK_LAYOUT)
@@ -54,6 +54,9 @@ def set_user(user_id, username):
     Args:
         user_id: Discord user ID (int or str)
         username: User's Discord username
+        
+    Returns:
+        True if successful, False otherwise
     """
     try:
         user_id = int(user_id)
@@ -65,8 +68,10 @@ def set_user(user_id, username):
             # Update username if user already exists
             user.username = username
             user.save()
+        return True
     except Exception as e:
         print(f"Error setting user {user_id}: {e}")
+        return False
 
 
 def set_user_preference(user_id, preference, value):
@@ -96,6 +101,52 @@ def set_user_preference(user_id, preference, value):
         return False
 
 
+def update_user(user_id, username=None, daily=None, weekly=None):
+    """Apply several changes to a user in a single atomic statement.
+    
+    With a username this is an upsert (INSERT ... ON CONFLICT DO UPDATE), so
+    it also registers new users. Without one, only existing users are updated.
+    Arguments left to None are not changed.
+    
+    Args:
+        user_id: Discord user ID (int or str)
+        username: New EPSI username, or None to keep the current one
+        daily: New daily preference, or None to keep it
+        weekly: New weekly preference, or None to keep it
+        
+    Returns:
+        The resulting row as a dict (id, username, daily, weekly), or None if
+        the user does not exist or the update failed
+    """
+    changes = {}
+    if username is not None:
+        changes[User.username] = username
+    if daily is not None:
+        changes[User.daily] = daily
+    if weekly is not None:
+        changes[User.weekly] = weekly
+    
+    try:
+        user_id = int(user_id)
+        if not changes:
+            query = User.select(User.id, User.username, User.daily, User.weekly).where(User.id == user_id)
+        elif username is not None:
+            query = (User
+                     .insert(id=user_id, username=username, daily=bool(daily), weekly=bool(weekly))
+                     .on_conflict(conflict_target=[User.id], update=changes)
+                     .returning(User.id, User.username, User.daily, User.weekly))
+        else:
+            query = (User
+                     .update(changes)
+                     .where(User.id == user_id)
+                     .returning(User.id, User.username, User.daily, User.weekly))
+        rows = list(query.dicts())
+        return rows[0] if rows else None
+    except Exception as e:
+        print(f"Error updating user {user_id}: {e}")
+        return None
+
+
 def get_user_preference(user_id, preference):
     """Get a user's preference (daily or weekly reminders).
     
@@ -116,6 +167,27 @@ def get_user_preference(user_id, preference):
         return False
 
 
+def set_dm_channel(user_id, channel_id):
+    """Remember the ID of a user's DM channel, or forget it with None.
+    
+    Args:
+        user_id: Discord user ID (int or str)
+        channel_id: DM channel ID, or None to clear it
+        
+    Returns:
+        True if a user row was updated, False otherwise
+    """
+    try:
+        updated = (User
+                   .update(dm_channel_id=channel_id)
+                   .where(User.id == int(user_id))
+                   .execute())
+        return updated > 0
+    except Exception as e:
+        print(f"Error setting DM channel for user {user_id}: {e}")
+        return False
+
+
 def remove_user(user_id):
     """Remove a user from the database.
     
@@ -149,6 +221,19 @@ def get_all_users():
         return []
 
 
+def get_user_rows():
+    """Get every user as plain (id, username, daily, weekly) tuples.
+    
+    Unlike the other helpers, errors are raised so that callers refreshing
+    a cache can keep their previous data when the database is unavailable.
+    
+    Returns:
+        List of (id, username, daily, weekly) tuples
+    """
+    query = User.select(User.id, User.username, User.daily, User.weekly).tuples()
+    return list(query)
+
+
 def get_users_with_preference(preference):
     """Get all users with a specific preference enabled.
     
@@ -166,4 +251,33 @@ def get_users_with_preference(preference):
         return list(query)
     except Exception as e:
         print(f"Error getting users with preference {preference}: {e}")
-        return [] 
\ No newline at end of file
+        return [] 
+
+def get_users_with_preference_page(preference, after_id=None, limit=1000):
+    """Get one page of the users with a specific preference enabled, by id.
+    
+    Only the id, username and dm_channel_id columns are selected, as tuples.
+    Pages are read by keyset (id > after_id), so each one is a short query
+    that holds no cursor open between calls. Errors are raised.
+    
+    Args:
+        preference: Either "daily" or "weekly"
+        after_id: Last id of the previous page, None for the first one
+        limit: Rows per page
+        
+    Returns:
+        List of (id, username, dm_channel_id) tuples ordered by id,
+        dm_channel_id being None when unknown
+    """
+    if preference not in ["daily", "weekly"]:
+        return []
+    
+    query = (User
+             .select(User.id, User.username, User.dm_channel_id)
+             .where(getattr(User, preference) == True)
+             .order_by(User.id)
+             .limit(limit)
+             .tuples())
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    return list(query)
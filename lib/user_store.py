@@ -0,0 +1,215 @@
+"""Async facade over lib.user_manager for use from the event loop.
+
+peewee and psycopg2 are blocking, so every query is run on a small dedicated
+thread pool instead of on the event loop. Command handlers and cron jobs
+await these functions; lib.user_manager stays the synchronous implementation.
+
+Users are also kept in a process-local registry, loaded at startup and
+updated write-through, so that reads (get_user, get_user_preference) never
+hit the database. The registry is reloaded periodically in case several
+bot instances share the database.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from lib import user_manager
+from lib.db import db, check_db_health
+from lib.env import env_int, env_float
+
+
+_executor = None
+
+# user_id -> {'username': ..., 'daily': ..., 'weekly': ...}, None until loaded
+_users = None
+# Writes made since the last reload started, re-applied over the reloaded data
+_recent_writes = {}
+_refresh_task = None
+
+
+def _get_executor():
+    """Return the DB thread pool, sized by DB_THREADS (default 4)."""
+    global _executor
+    if _executor is None:
+        workers = max(1, env_int('DB_THREADS', 4))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        logging.info(f"DB executor started ({workers} thread(s))")
+    return _executor
+
+
+def shutdown():
+    """Stop the DB thread pool once pending queries have finished and close the pool."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    db.close_all()
+
+
+def _in_connection(func, *args):
+    # Check a pooled connection out for this call only, returning it afterwards
+    with db.connection_context():
+        return func(*args)
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(_in_connection, func, *args))
+
+
+async def check_health():
+    """Async version of db.check_db_health."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), check_db_health)
+
+
+def _cache_write(user_id, entry):
+    """Apply a successful write to the registry (entry None means removed)."""
+    user_id = int(user_id)
+    _recent_writes[user_id] = entry
+    if _users is None:
+        return
+    if entry is None:
+        _users.pop(user_id, None)
+    else:
+        _users[user_id] = entry
+
+
+async def load_cache():
+    """(Re)load the user registry from the database.
+
+    On failure the previous registry is kept and False is returned.
+    """
+    global _users
+    _recent_writes.clear()
+    try:
+        rows = await _run(user_manager.get_user_rows)
+    except Exception as e:
+        logging.error(f"Failed to load user registry: {e}")
+        return False
+
+    users = {
+        user_id: {'username': username, 'daily': daily, 'weekly': weekly}
+        for user_id, username, daily, weekly in rows
+    }
+    # Writes that completed while the query ran are newer than its snapshot
+    for user_id, entry in _recent_writes.items():
+        if entry is None:
+            users.pop(user_id, None)
+        else:
+            users[user_id] = entry
+    _users = users
+    logging.info(f"User registry loaded ({len(_users)} user(s))")
+    return True
+
+
+async def _refresh_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        await load_cache()
+
+
+def start_refresh():
+    """Reload the registry every USER_CACHE_REFRESH_SECONDS (default 300, 0 disables)."""
+    global _refresh_task
+    interval = env_float('USER_CACHE_REFRESH_SECONDS', 300)
+    if interval > 0 and _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_loop(interval))
+
+
+def stop_refresh():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+
+
+async def get_user(user_id):
+    """Async version of user_manager.get_user, served from the registry once loaded."""
+    if _users is not None:
+        entry = _users.get(int(user_id))
+        return entry['username'] if entry else None
+    return await _run(user_manager.get_user, user_id)
+
+
+async def set_user(user_id, username):
+    """Async version of user_manager.set_user, writing through to the registry."""
+    success = await _run(user_manager.set_user, user_id, username)
+    if success:
+        previous = (_users or {}).get(int(user_id)) or {'daily': False, 'weekly': False}
+        _cache_write(user_id, {**previous, 'username': username})
+    return success
+
+
+async def set_user_preference(user_id, preference, value):
+    """Async version of user_manager.set_user_preference, writing through to the registry."""
+    success = await _run(user_manager.set_user_preference, user_id, preference, value)
+    if success and _users is not None and int(user_id) in _users:
+        _cache_write(user_id, {**_users[int(user_id)], preference: value})
+    return success
+
+
+async def update_user(user_id, username=None, daily=None, weekly=None):
+    """Async version of user_manager.update_user, writing through to the registry."""
+    row = await _run(user_manager.update_user, user_id, username, daily, weekly)
+    if row is not None:
+        _cache_write(row['id'], {'username': row['username'], 'daily': row['daily'], 'weekly': row['weekly']})
+    return row
+
+
+async def get_user_preference(user_id, preference):
+    """Async version of user_manager.get_user_preference, served from the registry once loaded."""
+    if _users is not None:
+        entry = _users.get(int(user_id))
+        return bool(entry.get(preference, False)) if entry else False
+    return await _run(user_manager.get_user_preference, user_id, preference)
+
+
+async def set_dm_channel(user_id, channel_id):
+    """Async version of user_manager.set_dm_channel."""
+    return await _run(user_manager.set_dm_channel, user_id, channel_id)
+
+
+async def remove_user(user_id):
+    """Async version of user_manager.remove_user, writing through to the registry."""
+    success = await _run(user_manager.remove_user, user_id)
+    if success:
+        _cache_write(user_id, None)
+    return success
+
+
+async def get_all_users():
+    """Async version of user_manager.get_all_users."""
+    return await _run(user_manager.get_all_users)
+
+
+async def get_users_with_preference(preference):
+    """Async version of user_manager.get_users_with_preference."""
+    return await _run(user_manager.get_users_with_preference, preference)
+
+
+async def iter_subscribers(preference, page_size=1000):
+    """Stream (id, username, dm_channel_id) tuples of users with preference enabled.
+
+    Users are read page_size at a time with user_manager.get_users_with_preference_page,
+    each page on its own DB call, so no thread or connection stays pinned
+    while the consumer works. The next page is read while the current one is
+    consumed, and at most two pages are held in memory.
+    """
+    page = asyncio.ensure_future(_run(user_manager.get_users_with_preference_page, preference, None, page_size))
+    try:
+        while page is not None:
+            rows = await page
+            page = None
+            if len(rows) == page_size:
+                page = asyncio.ensure_future(
+                    _run(user_manager.get_users_with_preference_page, preference, rows[-1][0], page_size)
+                )
+            for row in rows:
+                yield row
+    finally:
+        if page is not None:
+            # Consumer stopped early: let the prefetched page finish and drop it
+            await asyncio.gather(page, return_exceptions=True)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import api, cache  # noqa: E402
+
+
+@pytest.fixture
+def fresh_api(monkeypatch):
+    """lib.api with empty caches, a fresh circuit and no session, torn down after the test."""
+    monkeypatch.delenv('DATA_DIR', raising=False)
+    monkeypatch.setenv('API_BACKOFF_MAX', '0.01')
+    monkeypatch.setattr(api, '_session', None)
+    monkeypatch.setattr(api, '_schedule_cache', None)
+    monkeypatch.setattr(api, '_last_good', None)
+    monkeypatch.setattr(api, '_validators', None)
+    monkeypatch.setattr(api, '_circuit', None)
+    monkeypatch.setattr(api, '_inflight', cache.SingleFlight())
+    return api
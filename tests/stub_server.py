@@ -0,0 +1,64 @@
+"""Local stand-in for the schedule API, used by the tests and benchmarks."""
+
+import asyncio
+import contextlib
+
+from aiohttp import web
+
+
+class StubAPI:
+    """Schedule API stub served on a random local port.
+
+    Every request is counted in hits and its path kept in paths. The answer is
+    produced by handler(request), an async callable returning a
+    web.Response; by default a one-course day (or week) is returned after
+    delay seconds.
+    """
+
+    def __init__(self, handler=None, delay=0.0):
+        self.handler = handler or self._default
+        self.delay = delay
+        self.hits = 0
+        self.paths = []
+        self._peers = set()
+        self.url = None
+        self._runner = None
+
+    async def _default(self, request):
+        await asyncio.sleep(self.delay)
+        day = [{'name': 'Cours', 'date': '01/01/2024', 'start_time': '09:00', 'end_time': '10:00'}]
+        # The week endpoint answers one list per day
+        return web.json_response([day] if request.path.startswith('/week/') else day)
+
+    async def _handle(self, request):
+        self.hits += 1
+        self.paths.append(request.path_qs)
+        self._peers.add(request.transport.get_extra_info('peername'))
+        return await self.handler(request)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    @property
+    def connections(self):
+        """Distinct client connections seen, i.e. TCP handshakes paid by the client."""
+        return len(self._peers)
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+@contextlib.asynccontextmanager
+async def stub_api(**kwargs):
+    stub = await StubAPI(**kwargs).start()
+    try:
+        yield stub
+    finally:
+        await stub.stop()
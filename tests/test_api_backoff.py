@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from stub_server import stub_api
+
+
+def _rate_limited(retry_after):
+    async def handler(request):
+        return web.Response(status=429, headers={'Retry-After': str(retry_after)})
+    return handler
+
+
+def test_long_retry_after_fails_at_once(fresh_api, monkeypatch):
+    async def scenario():
+        async with stub_api(handler=_rate_limited(5)) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            started = time.monotonic()
+            with pytest.raises(fresh_api.APIError) as excinfo:
+                await fresh_api.fetch_day_schedule('alice', '08/01/2024')
+            await fresh_api.close_session()
+            return stub, time.monotonic() - started, excinfo.value
+
+    stub, elapsed, error = asyncio.run(scenario())
+
+    assert stub.hits == 1
+    assert elapsed < 1
+    assert error.status == 429
+
+
+def test_short_retry_after_is_honoured(fresh_api, monkeypatch):
+    monkeypatch.setenv('API_BACKOFF_MAX', '1')
+
+    async def scenario():
+        async with stub_api(handler=_rate_limited(0.1)) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            with pytest.raises(fresh_api.APIError):
+                await fresh_api.fetch_day_schedule('alice', '08/01/2024', max_retries=2)
+            await fresh_api.close_session()
+            return stub
+
+    assert asyncio.run(scenario()).hits == 2
@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+import discord
+import pytest
+
+pytest.importorskip('cairo')
+# lib.db needs a database configured at import time; nothing is queried here
+os.environ.setdefault('SQLITE_DATABASE', ':memory:')
+
+from lib import cron_jobs, dispatch  # noqa: E402
+from test_dispatch import FakeChannel, FakeResponse  # noqa: E402
+
+
+class FakeUser:
+    def __init__(self, channel):
+        self.dm_channel = None
+        self._channel = channel
+        self.dms_opened = 0
+
+    async def create_dm(self):
+        self.dms_opened += 1
+        self.dm_channel = self._channel
+        return self._channel
+
+
+class FakeBot:
+    """The parts of discord.Client used by the cron delivery."""
+
+    def __init__(self, channels, users):
+        self.channels = channels
+        self.users = users
+        self.fetched = []
+
+    def get_partial_messageable(self, channel_id, type=None):
+        return self.channels[channel_id]
+
+    def get_user(self, user_id):
+        return None
+
+    async def fetch_user(self, user_id):
+        self.fetched.append(user_id)
+        return self.users[user_id]
+
+
+@pytest.fixture
+def stored_channels(monkeypatch):
+    monkeypatch.setattr(dispatch, '_delivery_queue', None)
+    stored = {}
+
+    async def set_dm_channel(user_id, channel_id):
+        stored[user_id] = channel_id
+        return True
+
+    monkeypatch.setattr(cron_jobs, 'set_dm_channel', set_dm_channel)
+    return stored
+
+
+def deliver(bot, subscriber):
+    async def scenario():
+        outcome = await cron_jobs._send_image(bot, subscriber, b'png', "contenu", "edt")
+        await dispatch.stop()
+        return outcome
+
+    return asyncio.run(scenario())
+
+
+def test_known_channel_is_used_without_any_lookup(stored_channels):
+    channel = FakeChannel()
+    bot = FakeBot({42: channel}, {})
+
+    assert deliver(bot, (1, 'alice', 42)) == cron_jobs.SENT
+    assert channel.sent == ["contenu"]
+    assert bot.fetched == []
+    assert stored_channels == {}
+
+
+def test_unknown_channel_is_opened_once_and_stored(stored_channels):
+    channel = FakeChannel()
+    channel.id = 77
+    user = FakeUser(channel)
+    bot = FakeBot({}, {1: user})
+
+    assert deliver(bot, (1, 'alice', None)) == cron_jobs.SENT
+    assert user.dms_opened == 1
+    assert stored_channels == {1: 77}
+
+
+def test_vanished_channel_is_cleared_and_reopened(stored_channels):
+    gone = FakeChannel(failures=[discord.NotFound(FakeResponse(404), "unknown channel")])
+    fresh = FakeChannel()
+    fresh.id = 88
+    bot = FakeBot({42: gone}, {1: FakeUser(fresh)})
+
+    assert deliver(bot, (1, 'alice', 42)) == cron_jobs.SENT
+    assert fresh.sent == ["contenu"]
+    assert stored_channels == {1: 88}
+
+
+def test_forbidden_dm_is_counted(stored_channels):
+    channel = FakeChannel(failures=[discord.Forbidden(FakeResponse(403), "closed DMs")])
+    bot = FakeBot({42: channel}, {})
+
+    assert deliver(bot, (1, 'alice', 42)) == cron_jobs.FORBIDDEN
+    assert channel.attempts == 1
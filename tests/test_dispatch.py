@@ -0,0 +1,202 @@
+import asyncio
+import time
+
+import discord
+import pytest
+
+from lib import dispatch
+from lib.dispatch import DeliveryQueue, TokenBucket, INTERACTIVE, BACKGROUND
+
+
+class FakeResponse:
+    """Just enough of an aiohttp response to build discord.HTTPException."""
+
+    def __init__(self, status):
+        self.status = status
+        self.reason = "fake"
+
+
+class FakeChannel:
+    """Stands in for a discord.py messageable: records sends, fails on demand."""
+
+    def __init__(self, failures=()):
+        self.sent = []
+        self.attempts = 0
+        self._failures = list(failures)
+
+    async def send(self, content=None, **kwargs):
+        self.attempts += 1
+        if self._failures:
+            raise self._failures.pop(0)
+        self.sent.append(content)
+        return content
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_interactive_sends_go_before_queued_background_sends():
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=1)
+        channel = FakeChannel()
+        gate = asyncio.Event()
+
+        async def blocked():
+            await gate.wait()
+            return await channel.send("first")
+
+        first = asyncio.ensure_future(queue.submit(blocked, BACKGROUND))
+        await asyncio.sleep(0)
+        background = [
+            asyncio.ensure_future(queue.submit(lambda i=i: channel.send(f"cron {i}"), BACKGROUND))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(queue.submit(lambda: channel.send("reply"), INTERACTIVE))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, interactive, *background)
+        await queue.stop()
+        return channel.sent
+
+    assert run(scenario()) == ["first", "reply", "cron 0", "cron 1", "cron 2"]
+
+
+def test_token_bucket_paces_sends():
+    async def scenario():
+        queue = DeliveryQueue(rate=50, burst=5, workers=8)
+        channel = FakeChannel()
+        started = time.monotonic()
+        await asyncio.gather(*(queue.submit(lambda: channel.send("x")) for _ in range(25)))
+        elapsed = time.monotonic() - started
+        await queue.stop()
+        return elapsed, len(channel.sent)
+
+    elapsed, sent = run(scenario())
+    # 5 sends from the burst, the other 20 at 50/s
+    assert sent == 25
+    assert elapsed >= 0.35
+
+
+def test_rate_limited_send_is_retried():
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=1, base_delay=0.01)
+        channel = FakeChannel(failures=[
+            discord.HTTPException(FakeResponse(429), "rate limited"),
+            discord.RateLimited(0.01),
+        ])
+        result = await queue.submit(lambda: channel.send("hello"))
+        stats = queue.stats()
+        await queue.stop()
+        return result, channel.attempts, stats
+
+    result, attempts, stats = run(scenario())
+    assert result == "hello"
+    assert attempts == 3
+    assert stats['retries'] == 2 and stats['sent'] == 1 and stats['failed'] == 0
+
+
+@pytest.mark.parametrize('error', [
+    discord.HTTPException(FakeResponse(500), "server error"),
+    discord.Forbidden(FakeResponse(403), "cannot send messages to this user"),
+])
+def test_other_failures_are_not_retried(error):
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=1, base_delay=0.01)
+        channel = FakeChannel(failures=[error])
+        with pytest.raises(type(error)):
+            await queue.submit(lambda: channel.send("hello"))
+        stats = queue.stats()
+        await queue.stop()
+        return channel.attempts, stats
+
+    attempts, stats = run(scenario())
+    # A 5xx may have been posted already: sending again could duplicate it
+    assert attempts == 1
+    assert stats['failed'] == 1 and stats['retries'] == 0
+
+
+def test_rate_limit_retries_are_bounded():
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=1, max_retries=2, base_delay=0.001)
+        channel = FakeChannel(failures=[discord.RateLimited(0.001)] * 5)
+        with pytest.raises(discord.RateLimited):
+            await queue.submit(lambda: channel.send("hello"))
+        await queue.stop()
+        return channel.attempts
+
+    assert run(scenario()) == 3
+
+
+def test_stats_report_depth_and_latency():
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=2)
+        channel = FakeChannel()
+
+        async def slow():
+            await asyncio.sleep(0.02)
+            return await channel.send("x")
+
+        pending = [asyncio.ensure_future(queue.submit(slow)) for _ in range(6)]
+        await asyncio.sleep(0.005)
+        depth = queue.stats()['depth']
+        await asyncio.gather(*pending)
+        stats = queue.stats()
+        await queue.stop()
+        return depth, stats
+
+    depth, stats = run(scenario())
+    assert depth == 4
+    assert stats['depth'] == 0 and stats['sent'] == 6
+    assert 0.02 <= stats['latency_p50'] <= stats['latency_p99']
+
+
+def test_token_bucket_refills_over_time():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0])
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    asyncio.run(take(2))
+    assert bucket._tokens == 0
+    now[0] = 0.15
+    bucket._refill()
+    assert bucket._tokens == pytest.approx(1.5)
+
+
+def test_module_send_uses_the_shared_queue(monkeypatch):
+    monkeypatch.setattr(dispatch, '_delivery_queue', None)
+    monkeypatch.setenv('DISCORD_SEND_WORKERS', '2')
+
+    async def scenario():
+        channel = FakeChannel()
+        await dispatch.send(lambda: channel.send("a"), INTERACTIVE)
+        await dispatch.send(lambda: channel.send("b"))
+        stats = dispatch.get_queue().stats()
+        await dispatch.stop()
+        return channel.sent, stats
+
+    sent, stats = run(scenario())
+    assert sent == ["a", "b"]
+    assert stats['sent'] == 2
+    assert dispatch.get_queue().workers == 2
+
+
+def test_stop_cancels_queued_and_in_flight_sends():
+    async def scenario():
+        queue = DeliveryQueue(rate=1000, burst=1000, workers=1)
+        never = asyncio.Event()
+
+        async def hanging():
+            await never.wait()
+
+        submits = [asyncio.ensure_future(queue.submit(hanging)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        return await asyncio.wait_for(asyncio.gather(*submits, return_exceptions=True), 1)
+
+    results = run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
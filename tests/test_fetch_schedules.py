@@ -0,0 +1,35 @@
+import asyncio
+
+from aiohttp import web
+
+from stub_server import stub_api
+
+
+def test_batch_fallback_respects_the_concurrency_limit(fresh_api, monkeypatch):
+    monkeypatch.setenv('API_BATCH_PATH', '/batch')
+    monkeypatch.setenv('API_BATCH_SIZE', '10')
+    monkeypatch.setenv('API_BATCH_CONCURRENCY', '2')
+    in_flight = {'now': 0, 'max': 0}
+
+    async def handler(request):
+        if request.method == 'POST':
+            return web.Response(status=400)
+        in_flight['now'] += 1
+        in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        await asyncio.sleep(0.02)
+        in_flight['now'] -= 1
+        return web.json_response([{'name': 'Cours'}])
+
+    async def scenario():
+        async with stub_api(handler=handler) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            users = [f'user{i}' for i in range(25)]
+            results = [item async for item in fresh_api.fetch_schedules(users, '08/01/2024', max_retries=1)]
+            await fresh_api.close_session()
+            return results
+
+    results = asyncio.run(scenario())
+
+    assert sorted(user for user, _ in results) == sorted(f'user{i}' for i in range(25))
+    assert all(data == [{'name': 'Cours'}] for _, data in results)
+    assert in_flight['max'] <= 2
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('cairo')
+
+from lib import render_cache, renderer  # noqa: E402
+
+
+def test_concurrent_identical_renders_are_drawn_once(monkeypatch):
+    monkeypatch.setattr(render_cache, '_memory', None)
+    monkeypatch.setattr(renderer, '_inflight', renderer.SingleFlight())
+    calls = []
+
+    async def fake_run(func, schedule):
+        calls.append(schedule)
+        await asyncio.sleep(0.1)
+        return True, b'png'
+
+    monkeypatch.setattr(renderer, '_run', fake_run)
+    schedule = [{'date': '2024-01-08', 'name': 'Cours', 'start_time': '09:00', 'end_time': '10:00'}]
+
+    async def scenario():
+        return await asyncio.gather(*(renderer.render_week_image(schedule) for _ in range(20)))
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert results == [(True, b'png')] * 20
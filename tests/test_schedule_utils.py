@@ -0,0 +1,46 @@
+import threading
+
+import pytest
+
+pytest.importorskip('cairo')
+
+from lib import schedule_utils  # noqa: E402
+
+
+def test_static_layer_is_reused_within_a_thread():
+    first = schedule_utils._static_layer(800, 900, 1)
+
+    assert schedule_utils._static_layer(800, 900, 1) is first
+    assert schedule_utils._static_layer(1600, 900, 5) is not first
+
+
+def test_static_layer_is_not_shared_between_threads():
+    layers = []
+
+    def render():
+        layers.append(schedule_utils._static_layer(800, 900, 1))
+
+    threads = [threading.Thread(target=render) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(layer) for layer in layers}) == 3
+
+
+def test_concurrent_renders_from_threads_succeed():
+    schedule = [{'name': "Cours", 'date': '08/01/2024', 'start_time': '09:00', 'end_time': '10:30', 'room': 'A1'}]
+    results = []
+
+    def render():
+        for _ in range(10):
+            results.append(schedule_utils.day_schedule_image(schedule)[0])
+
+    threads = [threading.Thread(target=render) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 40
@@ -0,0 +1,118 @@
+import asyncio
+import gc
+
+import pytest
+from aiohttp import web
+
+from lib.cache import SingleFlight
+from stub_server import stub_api
+
+
+N = 50
+
+
+def test_concurrent_identical_requests_hit_upstream_once(fresh_api, monkeypatch):
+    async def scenario():
+        async with stub_api(delay=0.2) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            results = await asyncio.gather(*(
+                fresh_api.fetch_day_schedule('alice', '08/01/2024') for _ in range(N)
+            ))
+            await fresh_api.close_session()
+            return stub, results
+
+    stub, results = asyncio.run(scenario())
+
+    assert stub.hits == 1
+    assert all(result == results[0] for result in results)
+    assert fresh_api._inflight.stats() == {'calls': N, 'shared': N - 1, 'in_flight': 0}
+
+
+def test_failure_reaches_every_waiter_without_poisoning_later_calls(fresh_api, monkeypatch):
+    status = {'code': 404}
+
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        if status['code'] != 200:
+            return web.Response(status=status['code'])
+        return web.json_response([{'name': 'Cours'}])
+
+    async def scenario():
+        async with stub_api(handler=handler) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            failures = await asyncio.gather(
+                *(fresh_api.fetch_day_schedule('bob', '08/01/2024') for _ in range(N)),
+                return_exceptions=True,
+            )
+            hits_after_failure = stub.hits
+
+            status['code'] = 200
+            result = await fresh_api.fetch_day_schedule('bob', '08/01/2024')
+            await fresh_api.close_session()
+            return failures, hits_after_failure, stub.hits, result
+
+    failures, hits_after_failure, hits, result = asyncio.run(scenario())
+
+    assert hits_after_failure == 1
+    assert all(isinstance(error, fresh_api.APIError) and error.status == 404 for error in failures)
+    assert hits == 2
+    assert result == [{'name': 'Cours'}]
+
+
+def test_different_keys_are_not_coalesced(fresh_api, monkeypatch):
+    async def scenario():
+        async with stub_api(delay=0.1) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            await asyncio.gather(
+                fresh_api.fetch_day_schedule('alice', '08/01/2024'),
+                fresh_api.fetch_day_schedule('alice', '09/01/2024'),
+                fresh_api.fetch_week_schedule('alice', '08/01/2024'),
+            )
+            await fresh_api.close_session()
+            return stub.hits
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_failed_flight_with_only_cancelled_waiters_is_not_reported():
+    reported = []
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: reported.append(context))
+        flights = SingleFlight()
+        waiters = [asyncio.ensure_future(flights.do('key', failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        del waiters
+        gc.collect()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    gc.collect()
+
+    assert not [context for context in reported if 'never retrieved' in context.get('message', '')]
+
+
+@pytest.mark.parametrize('callers', [1, 10])
+def test_cancelled_waiter_does_not_cancel_the_shared_call(callers):
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        first = asyncio.ensure_future(flights.do('key', work))
+        others = [asyncio.ensure_future(flights.do('key', work)) for _ in range(callers)]
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(scenario()) == ['done'] * callers
@@ -0,0 +1,62 @@
+import asyncio
+
+from aiohttp import web
+
+from stub_server import stub_api
+
+
+def test_batch_fetch_drops_validators_of_the_replaced_schedule(fresh_api, monkeypatch):
+    old_day = [{'name': 'Ancien cours'}]
+    new_day = [{'name': 'Nouveau cours'}]
+    conditional = []
+
+    async def handler(request):
+        if request.method == 'POST':
+            return web.json_response({'alice': new_day})
+        conditional.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(old_day, headers={'ETag': '"v1"'})
+
+    async def scenario():
+        async with stub_api(handler=handler) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            monkeypatch.setenv('API_BATCH_PATH', '/batch')
+            date = fresh_api._format_date('08/01/2024')
+            key = ('alice', date, 'day')
+
+            await fresh_api.fetch_day_schedule('alice', '08/01/2024')
+            assert fresh_api.validator_cache().get(key) is not None
+
+            await fresh_api._fetch_batch(['alice'], date, 'day', max_retries=1)
+            assert fresh_api.validator_cache().get(key) is None
+
+            # Revalidating with the old ETag would bring the old schedule back
+            result = await fresh_api.fetch_day_schedule('alice', '08/01/2024', use_cache=False)
+            await fresh_api.close_session()
+            return result
+
+    result = asyncio.run(scenario())
+
+    assert conditional == [None, None]
+    assert result == old_day
+
+
+def test_not_modified_keeps_the_validators_it_carries(fresh_api, monkeypatch):
+    async def handler(request):
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v2"'})
+        return web.json_response([{'name': 'Cours'}], headers={'ETag': '"v1"'})
+
+    async def scenario():
+        async with stub_api(handler=handler) as stub:
+            monkeypatch.setenv('API_URL', stub.url)
+            await fresh_api.fetch_day_schedule('alice', '08/01/2024')
+            await fresh_api.fetch_day_schedule('alice', '08/01/2024', use_cache=False)
+            await fresh_api.close_session()
+
+    asyncio.run(scenario())
+
+    validators = fresh_api.validator_cache().get(('alice', fresh_api._format_date('08/01/2024'), 'day'))
+    assert validators['etag'] == '"v2"'
+    assert validators['body_hash'] is not None